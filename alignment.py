@@ -0,0 +1,154 @@
+'''
+    File name: alignment.py
+    Description: Alignment of the partitions of topic networks, as the mutual
+                 information (MI) and normalized mutual information (NMI) of the
+                 clusters of the users present in both networks of every pair.
+    Python Version: 3.8
+'''
+import logging
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+import graph_store as gs
+
+
+def load_memberships(filenames, attribute="finetuned_cluster"):
+    """
+    Loads the cluster of every user of every RICH network into a shared user index.
+
+    Each network is read once (through the binary cache of graph_store).
+
+    Args:
+        filenames (list): The RICH GraphML files, one per topic.
+        attribute (str, optional): Node attribute holding the cluster. Defaults to "finetuned_cluster".
+
+    Returns:
+        tuple: The user ids of the shared index, and for every network the index
+        positions of its users and their clusters, or None when the network has
+        no such attribute.
+    """
+    networks = []
+    for filename in filenames:
+        try:
+            graph = gs.load_graph(filename, attributes=["user_id", attribute])
+        except KeyError:
+            logging.info(f"{filename} has no {attribute} attribute, its alignments are left undefined.")
+            networks.append(None)
+            continue
+        networks.append((np.asarray(graph.attributes["user_id"], dtype=str),
+                         np.asarray(graph.attributes[attribute], dtype=np.int64)))
+
+    user_ids = [users for users, _ in filter(None, networks)]
+    codes, user_index = pd.factorize(np.concatenate(user_ids) if user_ids else np.empty(0, dtype=str))
+
+    memberships = []
+    offset = 0
+    for network in networks:
+        if network is None:
+            memberships.append(None)
+            continue
+        n = len(network[0])
+        memberships.append((codes[offset:offset + n], network[1]))
+        offset += n
+
+    return np.asarray(user_index), memberships
+
+def membership_matrix(memberships, n_users, n_clusters):
+    """
+    Builds the sparse user x (topic, cluster) indicator matrix.
+
+    Column t * n_clusters + c is 1 for the users of cluster c of topic t.
+    """
+    rows, cols = [], []
+    for t, membership in enumerate(memberships):
+        if membership is None:
+            continue
+        users, clusters = membership
+        rows.append(users)
+        cols.append(t * n_clusters + clusters)
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+
+    return scipy.sparse.csr_array((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                                  shape=(n_users, len(memberships) * n_clusters))
+
+def _plogp(p, q):
+    """Returns p * log2(p / q), with 0 log 0 = 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p > 0, p * np.log2(p / np.where(q > 0, q, 1)), 0.0)
+
+def alignment_matrices(memberships, n_users):
+    """
+    Computes the MI and NMI between the partitions of every pair of topics.
+
+    All contingency tables come from a single sparse product M^T M of the
+    membership matrix. For a pair of topics X and Y only the users present in
+    both networks count (a closed system); with p the joint and p_x, p_y the
+    marginal cluster probabilities of these users:
+        MI    = sum p log2(p / (p_x p_y))
+        H_x   = -sum p_x log2 p_x
+        H_x|y = -sum p log2(p / p_y)
+        NMI   = 2 (H_x - H_x|y) / (H_x + H_y)
+    The diagonal is 1 for the topics with a partition. Pairs without common
+    users, or whose entropies are both 0, and the rows and columns of the
+    topics without a partition are NaN.
+
+    Args:
+        memberships (list): Per topic, the user index positions and clusters (see load_memberships).
+        n_users (int): Size of the shared user index.
+
+    Returns:
+        tuple: The MI and NMI matrices, topic x topic.
+    """
+    n_topics = len(memberships)
+    clusters = [membership[1] for membership in memberships if membership is not None and len(membership[1])]
+    n_clusters = max(int(c.max()) for c in clusters) + 1 if clusters else 1
+
+    M = membership_matrix(memberships, n_users, n_clusters)
+    counts = (M.T @ M).toarray().reshape(n_topics, n_clusters, n_topics, n_clusters).transpose(0, 2, 1, 3)
+
+    # Joint and marginal probabilities over the users in both networks of a pair
+    n_common = counts.sum(axis=(2, 3))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = counts / n_common[:, :, None, None]
+    p_x = p.sum(axis=3)
+    p_y = p.sum(axis=2)
+
+    MI = _plogp(p, p_x[:, :, :, None] * p_y[:, :, None, :]).sum(axis=(2, 3))
+    H_x = -_plogp(p_x, 1).sum(axis=2)
+    H_y = -_plogp(p_y, 1).sum(axis=2)
+    H_x_given_y = -_plogp(p, p_y[:, :, None, :]).sum(axis=(2, 3))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        NMI = 2 * ((H_x - H_x_given_y) / (H_x + H_y))
+
+    undefined = n_common == 0
+    MI[undefined] = np.nan
+    NMI[undefined | (H_x + H_y == 0)] = np.nan
+
+    missing = np.array([membership is None for membership in memberships])
+    partitioned = np.flatnonzero(~missing)
+    for matrix in (MI, NMI):
+        matrix[partitioned, partitioned] = 1
+        matrix[missing, :] = np.nan
+        matrix[:, missing] = np.nan
+
+    return MI, NMI
+
+def topic_alignment(filenames, attribute="finetuned_cluster"):
+    """
+    Computes the MI and NMI matrices of the partitions of RICH networks.
+
+    Args:
+        filenames (list): The RICH GraphML files, one per topic, in matrix order.
+        attribute (str, optional): Node attribute holding the cluster. Defaults to "finetuned_cluster".
+
+    Returns:
+        tuple: The MI and NMI matrices, topic x topic.
+    """
+    user_index, memberships = load_memberships(filenames, attribute)
+    logging.info(f"Aligning {len(filenames)} partitions over {len(user_index)} users.")
+    return alignment_matrices(memberships, len(user_index))
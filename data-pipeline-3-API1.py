@@ -1,215 +1,22 @@
 import os
-import json
-import re
 import logging
-from datetime import datetime
-
-import pandas as pd
-from tqdm import tqdm
-
-from libvoikko import Voikko
-import networkx as nx
-
 import argparse
 
-v = Voikko(language="fi", path="./dict")
-
-# Helper functions
-
-def check_retweet_status(obj):
-    """
-    Checks whether an object is a retweet.
-
-    Args:
-        obj (dict): A dictionary representing the object to check.
-
-    Returns:
-        bool: True if the object is a retweet, False otherwise.
-    """
-    return "retweeted_status" in obj and not obj["is_quote_status"]
-
-def extract_tokens(text):
-    """
-    Extracts all words from a text string.
-
-    Args:
-        text (str): The text string to extract words from.
-
-    Returns:
-        list: A list of all words in the text string, in the order they appear.
-    """
-    return re.findall(r"\b[A-Za-z-äö]+\b", text)
-
-def remove_short_tokens(text, minimum_length = 2):
-    """
-    Removes all words from a list that are shorter than a given minimum length.
-
-    Args:
-        text (list): The list of words to remove short words from.
-        minimum_length (int, optional): The minimum length of words to keep. Defaults to 2.
-
-    Returns:
-        list: A list of all words in the input list that have a length greater than or equal to minimum_length.
-    """
-    return [w for w in text if len(w) >= minimum_length]
-
-def lemmatize_tokens(tokens):
-    """
-    Lemmatizes a list of tokens using the Voikko lemmatizer.
-
-    Args:
-        tokens (list): A list of tokenized words to be lemmatized.
-
-    Returns:
-        list: A list of the lemmatized tokens.
-
-    Raises:
-        ImportError: If the `libvoikko` package is not installed.
-
-    Note:
-        This function requires the `libvoikko` package to be installed. The lemmatization process
-        uses the Finnish Voikko lemmatizer, which can analyze and lemmatize Finnish words.
-        If a token cannot be analyzed, the original token is added to the output list.
-    """
-    lemmatized_tokens = []
-    for token in tokens:
-        lem_analysis = v.analyze(token)
-        if not lem_analysis:
-            lemmatized_tokens.append(token)
-        else:
-            lemma = lem_analysis[0].get("BASEFORM")
-            lemmatized_tokens.append(lemma)
-
-    return lemmatized_tokens
-
-def lowercase_tokens(tokens):
-    """
-    Converts all strings in the given list to lowercase.
-
-    Parameters:
-    strings (list): A list of strings.
-
-    Returns:
-    list: A new list with all the strings converted to lowercase.
-    """
-    return [s.lower() for s in tokens]
-
-def check_relevancy(tokens, selected_keywords):
-    """
-    Determines whether a set of tokens contains any of the selected keywords.
-    
-    Args:
-        tokens (set): A set of string tokens to check for relevancy.
-        selected_keywords (set): A set of string keywords to match against the tokens.
-    
-    Returns:
-        bool: True if the intersection of the token set and the selected keyword set is non-empty,
-        indicating that at least one keyword was found in the token set. False otherwise.
-    """
-    return bool(tokens & selected_keywords)
-
-def preprocess_keywords(keywords):
-
-    lemmatized_keywords = lowercase_tokens(
-                            lemmatize_tokens(keywords)
-                        )
-
-    return set(lemmatized_keywords)
-
-def remove_duplicates(raw_data):
-    """
-    Remove duplicate objects from a list of JSON objects.
-
-    Args:
-        raw_data (list): A list of JSON objects, each represented as a dictionary.
-
-    Returns:
-        list: A new list of JSON objects with duplicates removed.
-    """
-
-    logging.info(f"Number of json objects found is {len(raw_data)}.")
-    
-    no_duplicates = []
-
-    for obj in tqdm(raw_data):
-        if obj not in no_duplicates:
-            no_duplicates.append(obj)
-
-    logging.info(f"After removing the duplicates, we are left with {len(no_duplicates)} objects.")
-
-    return no_duplicates
-
-# Process functions
-
-def load_data(tweets_file):
-    
-    logging.info(f"Loading file {tweets_file} now.")
-
-    with open(file = os.path.join(input_data_dir, tweets_file), mode= "r") as read_file:
-        raw_data = json.load(read_file)
-    
-    return raw_data
-
-def filter_data(data):
-
-    data_preprocessed_1 = remove_duplicates(data)
-    data_preprocessed_2 = [obj for obj in data_preprocessed_1 if check_retweet_status(obj)]
-
-    return data_preprocessed_2
-
-def preprocess_text(text):
-    """
-    Preprocesses the input text by applying a series of text cleaning and normalization techniques,
-    including tokenization, lowercasing, lemmatization, and removal of short tokens.
-
-    Args:
-    - text (str): The input text to preprocess.
-
-    Returns:
-    - processed_text (list of str): A list of preprocessed tokens, in lowercase and lemmatized form,
-      with short tokens (i.e., tokens with length <= 2) removed.
-
-    Example:
-        text = "The quick brown fox jumps over the lazy dog."
-        preprocess_text(text)
-    ['quick', 'brown', 'fox', 'jump', 'over', 'lazy', 'dog']
-    """
-
-    processed_text = lowercase_tokens(
-                        lemmatize_tokens(
-                            remove_short_tokens(
-                                extract_tokens(text)
-                            )
-                        )
-                    )
-    
-    return set(processed_text)
-
-def save_network_data(edge_data, path, network_context):
-    """Saves network data to files in the specified directory.
+from libvoikko import Voikko
 
-    Args:
-        edge_data (list): List of tuples containing edge data.
-        path (str): Path to the directory where files will be saved.
-        network_context (str): Name of the network to be saved.
+import ingestion as ing
+import text_cache as tc
+import text_processing as tp
+import pipeline_engine as pe
 
-    Returns:
-        None
 
-    Saves two files in the specified directory:
-        - A comma-separated text file containing edge data (source, target, timestamp),
-          named <network_context>_edgelist.txt
-        - A GraphML file containing the network graph, named <network_context>_net.graphml
-    """
-    
-    df = pd.DataFrame(edge_data, columns=["source", "target", "timestamp"])
-   
-    full_path_edgelist = os.path.join(path, network_context + "_edgelist.txt")
-    df.to_csv(full_path_edgelist, index=False, header=False)
+# Set to a file path to keep the lemmas in a dictionary shared across runs and years
+LEMMA_DICTIONARY = None
 
-    full_path_graphml = os.path.join(path, network_context + "_net.graphml")
-    G = nx.from_pandas_edgelist(df, create_using = nx.DiGraph())
-    nx.write_graphml_lxml(G, full_path_graphml)
+def create_preprocessor():
+    """Creates the Voikko lemmatizer and the text preprocessor of a process."""
+    v = Voikko(language="fi", path="./dict")
+    return tp.TextPreprocessor(tc.LemmaCache(v, path=LEMMA_DICTIONARY))
 
 # :------------------: #
 
@@ -269,59 +76,64 @@ KEYWORD_MAP = {
 
 # Pipeline arguments
 parser = argparse.ArgumentParser()
-parser.add_argument("network_name")
+parser.add_argument("network_name", nargs="?")
 #parser.add_argument("year")
+parser.add_argument("--all-topics", action="store_true", help="Build every network of KEYWORD_MAP in a single pass over the data")
+parser.add_argument("--incremental", action="store_true", help="Only ingest the shards added since the last run and append their edges")
+parser.add_argument("--prefetch", type=int, default=2, help="Number of shards read and decompressed ahead while the current one is parsed")
 args = parser.parse_args()
 
+if not args.all_topics and args.network_name not in KEYWORD_MAP:
+    parser.error(f"network_name must be one of {', '.join(KEYWORD_MAP)} unless --all-topics is given")
+
 network_name = args.network_name
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Define input and output directories and network name
+# Define input and output directories and the networks to build
 input_data_dir = "/m/cs/scratch/networks/ecanet/elections/raw_tweets/finnish_election"
 output_data_dir = "./keywords_non_universal_stream_processed"
-network_context = KEYWORD_MAP[network_name]
-network_context_str = network_name
-
-def run_pipeline():
-
-    logging.info(f"Starting data pipeline for {network_context_str}...")
 
-    # Load data from input directory
-    twitter_files = sorted(os.listdir(input_data_dir))
-    
-    KEYWORDS_SELECTED = preprocess_keywords(network_context)
-
-    EDGE_DATA = []
-
-    for tf in tqdm(twitter_files):
+if args.all_topics:
+    network_contexts = KEYWORD_MAP
+    run_name = "ALL_TOPICS"
+else:
+    network_contexts = {network_name: KEYWORD_MAP[network_name]}
+    run_name = network_name
 
-        data = load_data(tf)
-        logging.info("Data loaded successfully")
+# Duplicates are always removed within each file. Set to "memory", "bloom" or "disk"
+# to also remove tweets repeated across files (see ingestion.Deduplicator).
+CROSS_FILE_DEDUPLICATION = None
 
-        data = filter_data(data)
-        logging.info("Data filtered successfully")
-        
-        for retweet in data:
+# Skip the preprocessing of tweets whose tokens all have a known, non-keyword lemma (see keyword_filter)
+KEYWORD_PREFILTER = True
 
-            tweet_text = retweet["retweeted_status"]["text"]
-  
-            TEXT_TOKENS = preprocess_text(tweet_text)
+# Keep the complete records of truncated shards instead of skipping them (corrupted shards are always skipped)
+SALVAGE_TRUNCATED_SHARDS = True
 
-            if check_relevancy(TEXT_TOKENS, KEYWORDS_SELECTED):
-                retweeter_node = retweet["user"]["id"]
-                retweeted_node = retweet["retweeted_status"]["user"]["id"]
+# Global user id -> integer dictionary shared by all topics and years (see edge_store.UserDictionary)
+USER_DICTIONARY = "./user-dictionary.npy"
 
-                timestamp = retweet["timestamp"]
-                dt_object = datetime.fromtimestamp(timestamp)
-                formatted_timestamp = dt_object.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+def run_pipeline():
 
-                EDGE_DATA.append((retweeter_node, retweeted_node, formatted_timestamp))
-        
-    logging.info(f"Edge formation done successfully. {len(EDGE_DATA)} relevant edges were formed.")
-    save_network_data(EDGE_DATA, output_data_dir, network_context_str)
-    logging.info(f"Network {network_context_str} data saved successfully")
+    # Load data from input directory
+    twitter_files = sorted(os.listdir(input_data_dir))
+    if args.incremental:
+        # The newest file may still be growing; it is ingested by a later run once complete
+        twitter_files = twitter_files[:-1]
+    twitter_paths = [os.path.join(input_data_dir, tf) for tf in twitter_files]
+
+    # Every retweet is parsed and lemmatized once and then tested against the keywords of every network
+    pipeline = pe.RetweetPipeline(ing.V1Schema(timestamp_field = "timestamp", salvage = SALVAGE_TRUNCATED_SHARDS), twitter_paths, output_data_dir, network_contexts,
+                                  preprocessor_factory = create_preprocessor,
+                                  deduplication = CROSS_FILE_DEDUPLICATION,
+                                  prefilter = KEYWORD_PREFILTER,
+                                  prefetch = args.prefetch,
+                                  user_dictionary = USER_DICTIONARY,
+                                  run_name = run_name,
+                                  incremental = args.incremental)
+    pipeline.run()
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    run_pipeline()
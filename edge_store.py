@@ -0,0 +1,400 @@
+'''
+    File name: edge_store.py
+    Description: Columnar store of the retweet edges of a network. User ids are
+                 interned into int32 codes and timestamps stored as int64 epoch
+                 milliseconds, so loading a network is a memory map and a CSR
+                 build instead of parsing CSV or GraphML strings.
+    Python Version: 3.8
+'''
+import os
+import json
+import fcntl
+import logging
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import graph_store as gs
+
+
+STORE_VERSION = 1
+
+class UserDictionary():
+    """
+    Persistent mapping of Twitter user ids to dense integers shared by all networks.
+
+    The integer of a user is its position in the dictionary: users are only ever
+    appended, so a user keeps the same integer in every topic and year and
+    networks can be joined on integer arrays instead of string user ids.
+    The dictionary is a single .npy array of user ids. Adding users holds an
+    exclusive lock on <path>.lock while the file is read again, extended and
+    rewritten through a unique temporary file, so runs adding users at the
+    same time all keep their users.
+
+    Args:
+        path (str): Location of the dictionary file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.user_ids = np.empty(0, dtype=str)
+        self.index = pd.Index(self.user_ids)
+        self.stamp = None
+        self.n_added = 0
+        self._reload()
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def _reload(self):
+        """Reads the dictionary again if the file was replaced since it was last read."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stamp != self.stamp:
+            self.user_ids = np.load(self.path)
+            self.index = pd.Index(self.user_ids)
+            self.stamp = stamp
+
+    def _write(self):
+        directory, base = os.path.split(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=base + ".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, self.user_ids)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        stat = os.stat(self.path)
+        self.stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def encode(self, user_ids, add=True):
+        """
+        Returns the global integer of every user.
+
+        Args:
+            user_ids (array-like): The user ids as strings.
+            add (bool, optional): Append the unknown users to the dictionary file.
+                Otherwise their integer is -1. Defaults to True.
+
+        Returns:
+            np.ndarray: The int32 global integers.
+        """
+        user_ids = np.asarray(user_ids, dtype=str)
+        self._reload()
+        codes = self.index.get_indexer(user_ids)
+
+        missing = codes < 0
+        if not add or not missing.any():
+            return codes.astype(np.int32)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            # Other runs may have added users since the file was read
+            self._reload()
+            codes = self.index.get_indexer(user_ids)
+            missing = codes < 0
+
+            new_ids = pd.unique(user_ids[missing])
+            codes[missing] = len(self.user_ids) + pd.Index(new_ids).get_indexer(user_ids[missing])
+
+            self.user_ids = np.concatenate([self.user_ids, np.asarray(new_ids, dtype=str)])
+            self.index = pd.Index(self.user_ids)
+            self._write()
+            self.n_added += len(new_ids)
+
+        return codes.astype(np.int32)
+
+    def decode(self, codes):
+        """Returns the user ids of global integers."""
+        self._reload()
+        return self.user_ids[np.asarray(codes)]
+
+    def log_stats(self):
+        logging.info(f"User dictionary {self.path}: {len(self.user_ids)} users, {self.n_added} added.")
+        self.n_added = 0
+
+def store_path(path, network_context):
+    """Returns the directory of the edge store of a network."""
+    return os.path.join(path, network_context + "_edges")
+
+def parse_timestamps(timestamps):
+    """Converts ISO 8601 timestamps to int64 epoch milliseconds."""
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.int64)
+    parsed = pd.to_datetime(pd.Series(timestamps), utc=True, format="ISO8601")
+    return ((parsed - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)).to_numpy(dtype=np.int64)
+
+def format_timestamps(timestamps):
+    """Converts int64 epoch milliseconds back to ISO 8601 strings."""
+    return np.char.add(np.datetime_as_string(np.asarray(timestamps).astype("datetime64[ms]"), unit="ms"), "Z")
+
+def write_edge_store(path, sources, targets, timestamps, weights=None, user_dictionary=None):
+    """
+    Writes an edge list into a columnar edge store.
+
+    The store is a directory of .npy files:
+        users.npy       the id dictionary, user id of every code
+        sources.npy     int32 code of the source of every edge
+        targets.npy     int32 code of the target of every edge
+        timestamps.npy  int64 epoch milliseconds of every edge
+        weights.npy     int32 weight of every edge (1 for a single retweet)
+        time_order.npy  int64 edge indices sorted by timestamp, the time index
+        global_ids.npy  int32 global integer of every code (with a user_dictionary)
+    plus a meta.json. Users are coded in order of first appearance over the
+    interleaved endpoints, the node order of graph_store.from_edgelist. The
+    store is written into a temporary directory unique to the writer and
+    swapped in afterwards (see graph_store.replace_directory).
+
+    Args:
+        path (str): Directory of the store.
+        sources (array-like): Source user id of every edge.
+        targets (array-like): Target user id of every edge.
+        timestamps (array-like): ISO 8601 timestamp of every edge.
+        weights (array-like, optional): Weight of every edge. Defaults to 1.
+        user_dictionary (UserDictionary, optional): Global dictionary the users
+            are added to.
+    """
+    endpoints = np.column_stack([np.asarray(sources, dtype=str), np.asarray(targets, dtype=str)]).ravel()
+    codes, users = pd.factorize(endpoints)
+    codes = codes.reshape(-1, 2).astype(np.int32)
+
+    if weights is None:
+        weights = np.ones(len(codes), dtype=np.int32)
+
+    parent, base = os.path.split(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=base + ".tmp")
+    os.chmod(tmp_path, 0o755)
+
+    try:
+        np.save(os.path.join(tmp_path, "users.npy"), np.asarray(users, dtype=str))
+        np.save(os.path.join(tmp_path, "sources.npy"), np.ascontiguousarray(codes[:, 0]))
+        np.save(os.path.join(tmp_path, "targets.npy"), np.ascontiguousarray(codes[:, 1]))
+        timestamps = parse_timestamps(np.asarray(timestamps, dtype=str))
+        np.save(os.path.join(tmp_path, "timestamps.npy"), timestamps)
+        np.save(os.path.join(tmp_path, "time_order.npy"), np.argsort(timestamps, kind="stable").astype(np.int64))
+        np.save(os.path.join(tmp_path, "weights.npy"), np.asarray(weights, dtype=np.int32))
+        if user_dictionary is not None:
+            np.save(os.path.join(tmp_path, "global_ids.npy"), user_dictionary.encode(users))
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({"version": STORE_VERSION, "n_edges": len(codes), "n_users": len(users)}, f, indent=2)
+
+        gs.replace_directory(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+class EdgeStore():
+    """
+    Read-only view of an edge store written by write_edge_store.
+
+    Args:
+        path (str): Directory of the store.
+        mmap (bool, optional): Memory-map the columns instead of reading them. Defaults to True.
+    """
+
+    def __init__(self, path, mmap=True):
+        mmap_mode = "r" if mmap else None
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+
+        self.path = path
+        self.users = load("users.npy")
+        self.sources = load("sources.npy")
+        self.targets = load("targets.npy")
+        self.timestamps = load("timestamps.npy")
+        self.weights = load("weights.npy")
+        if os.path.exists(os.path.join(path, "time_order.npy")):
+            self.time_order = load("time_order.npy")
+        else:
+            self.time_order = np.argsort(self.timestamps, kind="stable")
+        self.global_ids = load("global_ids.npy") if os.path.exists(os.path.join(path, "global_ids.npy")) else None
+        self._sorted_timestamps = None
+
+    @property
+    def n_edges(self):
+        return len(self.sources)
+
+    @property
+    def n_users(self):
+        return len(self.users)
+
+    @property
+    def sorted_timestamps(self):
+        """The edge timestamps in time order, aligned with time_order."""
+        if self._sorted_timestamps is None:
+            self._sorted_timestamps = np.asarray(self.timestamps)[self.time_order]
+        return self._sorted_timestamps
+
+    def time_range(self):
+        """Returns the first and last edge timestamps in epoch milliseconds, or None for an empty store."""
+        if self.n_edges == 0:
+            return None
+        return int(self.sorted_timestamps[0]), int(self.sorted_timestamps[-1])
+
+    def between(self, start, end):
+        """
+        Returns the edges made in a time window.
+
+        Args:
+            start (int): Start of the window in epoch milliseconds, included.
+            end (int): End of the window in epoch milliseconds, excluded.
+
+        Returns:
+            np.ndarray: The indices of the edges of the window, in time order.
+        """
+        lo, hi = np.searchsorted(self.sorted_timestamps, [start, end], side="left")
+        return np.asarray(self.time_order[lo:hi])
+
+    def to_csr(self, edges=None, directed=True):
+        """
+        Builds the weighted graph of the store, or of a selection of its edges.
+
+        Repeated edges between the same users are aggregated into the weight,
+        like graph_store.from_edgelist on the original edge list.
+
+        Args:
+            edges (slice or array-like, optional): The edges to keep, e.g. a slice
+                or the indices of a time window. Defaults to all edges.
+            directed (bool, optional): Whether to build a directed graph. Defaults to True.
+
+        Returns:
+            graph_store.CSRGraph: The graph, with the user ids in node_ids.
+        """
+        if edges is None:
+            # The codes already are the dense node indices in from_edgelist order
+            sources, targets, weights = self.sources, self.targets, self.weights
+            n_nodes, node_ids = self.n_users, np.asarray(self.users)
+        else:
+            sources, targets, weights = self.sources[edges], self.targets[edges], self.weights[edges]
+            endpoints = np.column_stack([sources, targets]).ravel()
+            codes, used = pd.factorize(endpoints)
+            codes = codes.reshape(-1, 2)
+            sources, targets = codes[:, 0], codes[:, 1]
+            n_nodes, node_ids = len(used), np.asarray(self.users)[used]
+
+        indptr, indices, weights = gs.from_edge_arrays(sources, targets, n_nodes,
+                                                       directed=directed,
+                                                       weights=np.asarray(weights, dtype=np.int64))
+
+        return gs.CSRGraph(indptr=indptr,
+                           indices=indices,
+                           node_ids=node_ids,
+                           weights=weights.astype(np.int64),
+                           directed=directed)
+
+    def to_dataframe(self):
+        """Returns the edge list with user ids and ISO 8601 timestamps, as in the CSV edge lists."""
+        return pd.DataFrame({"source": self.users[self.sources],
+                             "target": self.users[self.targets],
+                             "timestamp": format_timestamps(self.timestamps)})
+
+def load_network(path, network_context, directed=True):
+    """
+    Loads the graph of a network straight from its edge store.
+
+    Args:
+        path (str): Directory holding the networks.
+        network_context (str): Name of the network.
+        directed (bool, optional): Whether to build a directed graph. Defaults to True.
+
+    Returns:
+        graph_store.CSRGraph: The weighted graph.
+    """
+    return EdgeStore(store_path(path, network_context)).to_csr(directed=directed)
+
+def graphml_store_path(filename):
+    """Returns the edge store written next to a <network_context>_net.graphml file."""
+    if not filename.endswith("_net.graphml"):
+        return None
+    return filename[:-len("_net.graphml")] + "_edges"
+
+def read_store_meta(path):
+    """Returns the meta.json of an edge store, or None if it cannot be read."""
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _graphml_stamp(filename):
+    stat = os.stat(filename)
+    return {"graphml_size": stat.st_size, "graphml_mtime_ns": stat.st_mtime_ns}
+
+def record_graphml(path, filename):
+    """
+    Records the size and modification time of the GraphML file written from an edge store.
+
+    load_graph only uses the store in place of a GraphML file that still has
+    them, so a GraphML file regenerated or copied in by other means is read
+    instead of the store.
+
+    Args:
+        path (str): Directory of the store.
+        filename (str): Path of the GraphML file.
+    """
+    meta = read_store_meta(path)
+    if meta is None:
+        return
+    meta.update(_graphml_stamp(filename))
+
+    fd, tmp_path = tempfile.mkstemp(dir=path, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+def is_store_current(path, filename):
+    """Checks whether an edge store exists and the GraphML file next to it is the one written from it."""
+    meta = read_store_meta(path)
+    if meta is None or "graphml_size" not in meta:
+        return False
+    try:
+        stamp = _graphml_stamp(filename)
+    except OSError:
+        return False
+    return meta["graphml_size"] == stamp["graphml_size"] and meta["graphml_mtime_ns"] == stamp["graphml_mtime_ns"]
+
+def load_graph(filename, attributes=None):
+    """
+    Loads a network from its edge store when one was written next to its GraphML file.
+
+    The store only holds the edges, so networks needing node attributes, and
+    networks without a store, are loaded through graph_store.load_graph, as
+    are GraphML files changed since they were written from the store (see
+    record_graphml).
+
+    Args:
+        filename (str): Path of the GraphML file.
+        attributes (iterable, optional): Node attributes to return. Defaults to all.
+
+    Returns:
+        graph_store.CSRGraph: The loaded graph. Node ids are the user ids as strings.
+    """
+    path = graphml_store_path(filename)
+    if path is not None and attributes is not None and len(attributes) == 0:
+        if is_store_current(path, filename):
+            try:
+                graph = EdgeStore(path).to_csr()
+                logging.info(f"Loaded {filename} from the edge store {path}.")
+                return graph
+            except (OSError, ValueError) as e:
+                # The store was replaced by another process while being read
+                logging.info(f"Could not read the edge store {path} ({e}), loading {filename} instead.")
+        elif os.path.exists(path):
+            logging.info(f"The edge store {path} was not written with the current {filename}, loading {filename} instead.")
+
+    return gs.load_graph(filename, attributes=attributes)
@@ -2,9 +2,15 @@ import networkx as nx
 import numpy as np
 import pymetis
 import copy
+import os
+import tempfile
 import pandas as pd
+import scipy.sparse
 import argparse
 
+import graph_store as gs
+import edge_store as es
+
 parser = argparse.ArgumentParser()
 parser.add_argument("netname")
 args = parser.parse_args()
@@ -12,41 +18,45 @@ netname = str(args.netname)
 year = "2023"
 
 CANDIDATES_INFORMATION = 1
+CANDIDATES = "candidates-2023.csv"
+CANDIDATES_COMPLETE = "candidates2023-complete.csv"
+
+# Candidate information joined on user id, rebuilt when a candidate file changes
+CANDIDATE_TABLE = "candidates2023-joined.pkl"
+CANDIDATE_ATTRIBUTES = ["screen_name", "party", "sex", "language"]
+
+# Global user id -> integer dictionary shared by all topics and years (see edge_store.UserDictionary).
+# It is only extended by the data pipelines; the enrichment reads it.
+USER_DICTIONARY = "./user-dictionary.npy"
 
 class SocialNetwork():
 
-    def __init__(self, name, filename):
+    def __init__(self, name, filename, user_dictionary=None):
         self.name = name
-        self.directed_graph = read_graphml_file(filename)
-        self.undirected_graph = self.directed_graph.to_undirected()
 
-        largest_cc = max(nx.connected_components(self.undirected_graph), key=len)
-        self.giant_component = self.undirected_graph.subgraph(largest_cc).copy()
+        # Only the giant component is kept, as a CSR graph; graph.node_ids maps its integer
+        # labels back to user ids. Self-loops stay in the enriched networks.
+        graph = es.load_graph(filename, attributes=[])
+        self.n_nodes_total = graph.n_nodes
+        self.graph = gs.prepare_graph(graph, remove_self_loops=False)
+        del graph
+
+        self.graph.attributes["user_id"] = self.graph.node_ids
+        if user_dictionary is not None:
+            # The same user has the same global_id in every network, -1 if the data pipelines never saw it
+            self.graph.attributes["global_id"] = user_dictionary.encode(self.graph.node_ids, add=False)
 
-        self.giant_component_int = nx.convert_node_labels_to_integers(self.giant_component, first_label = 0, ordering = 'default', label_attribute = 'user_id')
+    def add_attributes(self, columns):
+        """Stores node attribute columns (name -> array over the nodes) in the graph's side table."""
+        for name, column in columns.items():
+            self.graph.attributes[name] = np.asarray(column)
 
     def get_giant_component_fraction(self):
-        return len(self.giant_component)/len(self.undirected_graph)
+        return self.graph.n_nodes/self.n_nodes_total
 
     def get_adjacency_dict(self):
-        adj_list = {}
-        for node in self.giant_component_int.nodes:
-            neighbors = list(self.giant_component_int.neighbors(node))
-            adj_list[node] = neighbors
-        return adj_list
-
-def read_graphml_file(filename):
-    """Reads a graph from a GraphML file and returns a NetworkX graph object."""
-    try:
-        # Read the graph from the file
-        graph = nx.read_graphml(filename)
-
-        # Return the graph object
-        return graph
-    except Exception as e:
-        print(f"Error: {e}")
-        return None
-    
+        return {node: self.graph.neighbors(node) for node in range(self.graph.n_nodes)}
+
 def get_partition(net):
     adj_dict = net.get_adjacency_dict()
     adj_list = [np.asarray(neighs) for neighs in adj_dict.values()]
@@ -54,23 +64,64 @@ def get_partition(net):
     membership = dict(zip(adj_dict.keys(), membership))
     return n_cuts, membership
 
+def find_loner_nodes(graph, membership):
+    """
+    Finds the nodes none of whose neighbours is in their own cluster.
+
+    The number of same-cluster neighbours of every node is read from the
+    product of the adjacency matrix with the one-hot cluster indicator matrix.
+
+    Args:
+        graph (graph_store.CSRGraph): The giant component, nodes labelled 0..n-1.
+        membership (dict): Node -> cluster.
+
+    Returns:
+        list: The loner nodes, in increasing order.
+    """
+    n_nodes = graph.n_nodes
+    clusters = np.fromiter((membership[node] for node in range(n_nodes)), dtype=np.int64, count=n_nodes)
+
+    A = scipy.sparse.csr_array((np.ones(len(graph.indices), dtype=np.int64), graph.indices, graph.indptr), shape=(n_nodes, n_nodes))
+    indicator = scipy.sparse.csr_array((np.ones(n_nodes, dtype=np.int64), (np.arange(n_nodes), clusters)), shape=(n_nodes, clusters.max() + 1))
+
+    same_cluster_neighbors = (A @ indicator)[np.arange(n_nodes), clusters]
+    return np.flatnonzero(same_cluster_neighbors == 0).tolist()
+
+def modularity(graph, membership):
+    """
+    Computes the modularity of a partition of an undirected CSR graph.
+
+    Gives the value of nx.community.modularity on the same unweighted graph: a
+    self-loop counts once as an edge and twice in the degree of its node.
+
+    Args:
+        graph (graph_store.CSRGraph): The giant component, nodes labelled 0..n-1.
+        membership (dict): Node -> cluster.
+
+    Returns:
+        float: The modularity.
+    """
+    n_nodes = graph.n_nodes
+    clusters = np.fromiter((membership[node] for node in range(n_nodes)), dtype=np.int64, count=n_nodes)
+
+    rows = np.repeat(np.arange(n_nodes), graph.degree())
+    weights = np.where(rows == graph.indices, 2, 1)
+    two_m = weights.sum()
+
+    inside = clusters[rows] == clusters[graph.indices]
+    internal = np.bincount(clusters[rows][inside], weights=weights[inside], minlength=2)
+    degree = np.bincount(clusters[rows], weights=weights, minlength=2)
+
+    return float(np.sum(internal/two_m - (degree/two_m)**2))
+
 def finetune_partition(net, membership):
 
     potential_bridge_nodes = []
-    loner_nodes = []
-
-    for node in net.giant_component_int.nodes:
-        neighbors = net.giant_component_int.neighbors(node)
-        neighbors_cluster = set([net.giant_component_int.nodes[n]["cluster"] for n in neighbors])
-        if membership[node] not in neighbors_cluster:
-            loner_nodes.append(node)
+    loner_nodes = find_loner_nodes(net.graph, membership)
 
     membership_finetuned = copy.deepcopy(membership)
 
-    c0 = {k for k, v in membership.items() if v == 0}
-    c1 = {k for k, v in membership.items() if v == 1}
-
-    q_best = nx.community.modularity(net.giant_component_int, [c0, c1])
+    q_best = modularity(net.graph, membership)
     print(f"Before finetuning modularity is {q_best}")
 
     for node in loner_nodes:
@@ -81,11 +132,8 @@ def finetune_partition(net, membership):
         else:
             membership_finetuned[node] = 0
             new_label = 0
-        
-        c0_candidate = {k for k, v in membership_finetuned.items() if v == 0}
-        c1_candidate = {k for k, v in membership_finetuned.items() if v == 1}
 
-        new_q = nx.community.modularity(net.giant_component_int, [c0_candidate, c1_candidate])
+        new_q = modularity(net.graph, membership_finetuned)
         
         if new_q > q_best:
             print(f"Improvement {new_q - q_best} by swapping node {node}")
@@ -99,73 +147,77 @@ def finetune_partition(net, membership):
     print(f"After finetuning modularity is {q_best}")
     return membership
 
-def get_candidate_mappings():
-    candidates = pd.read_csv("candidates-2023.csv")
-    candidates_full = pd.read_csv("candidates2023-complete.csv")
-
-    id_2_candidate = dict(zip(candidates.id.astype(str), candidates.screen_name))
-    candidate_2_id = dict(zip(candidates.screen_name, candidates.id.astype(str)))
-
-    candidates_full['twitter_id'] = candidates_full['screen_name'].map(candidate_2_id)
-
-    id_2_party = dict(zip(candidates_full.twitter_id, candidates_full.puolue))
-    id_2_age = dict(zip(candidates_full.twitter_id, candidates_full.ikä))
-    id_2_sex = dict(zip(candidates_full.twitter_id, candidates_full.sukupuoli))
-    id_2_hometown = dict(zip(candidates_full.twitter_id, candidates_full.kotikunta))
-    id_2_lang = dict(zip(candidates_full.twitter_id, candidates_full.kieli))
+def load_candidate_table():
+    """
+    Returns the candidate information joined on Twitter user id, one row per candidate.
+
+    The two candidate files are read and joined once, and the joined table is
+    cached in CANDIDATE_TABLE until one of them changes. Candidates missing from
+    the complete list, or without a screen name or a party, are left out, as the
+    enrichment marks them "NA".
+    """
+    sources = [CANDIDATES, CANDIDATES_COMPLETE]
+    if os.path.exists(CANDIDATE_TABLE) and \
+            all(os.path.getmtime(CANDIDATE_TABLE) >= os.path.getmtime(source) for source in sources):
+        return pd.read_pickle(CANDIDATE_TABLE)
+
+    candidates = pd.read_csv(CANDIDATES)
+    candidates_full = pd.read_csv(CANDIDATES_COMPLETE)
+    candidates["id"] = candidates.id.astype(str)
+
+    # Repeated ids and screen names keep their last row, like the former dict mappings
+    candidate_2_id = candidates.drop_duplicates("screen_name", keep="last").set_index("screen_name")["id"]
+    candidates_full["user_id"] = candidates_full["screen_name"].map(candidate_2_id)
+    candidates_full = candidates_full.dropna(subset=["user_id"]).drop_duplicates("user_id", keep="last")
+
+    table = candidates.drop_duplicates("id", keep="last")[["id", "screen_name"]] \
+                      .rename(columns={"id": "user_id"}) \
+                      .merge(candidates_full[["user_id", "puolue", "ikä", "sukupuoli", "kotikunta", "kieli"]], on="user_id") \
+                      .rename(columns={"puolue": "party", "ikä": "age", "sukupuoli": "sex", "kotikunta": "hometown", "kieli": "language"})
+
+    table = table[table.screen_name.map(lambda x: isinstance(x, str)) & table.party.map(lambda x: isinstance(x, str))]
+    table["screen_name"] = table.screen_name.str.rstrip()
+    table["party"] = table.party.str.rstrip()
+    table = table.reset_index(drop=True)
+
+    # Concurrent enrichment runs each write their own temporary file
+    directory, base = os.path.split(os.path.abspath(CANDIDATE_TABLE))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=base + ".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            table.to_pickle(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, CANDIDATE_TABLE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
-    return id_2_candidate, id_2_party, id_2_age, id_2_sex, id_2_hometown, id_2_lang
+    return table
 
 def run_pipeline():
 
     filename = f"./pure-networks/{year}/{netname}_{year}_net.graphml"
-    net = SocialNetwork(name = f"{netname}{year}", filename = filename)
+    user_dictionary = es.UserDictionary(USER_DICTIONARY)
+    net = SocialNetwork(name = f"{netname}{year}", filename = filename, user_dictionary = user_dictionary)
     n_cuts, membership = get_partition(net)
 
     # ATTRIBUTE 1: Original partition
-    nx.set_node_attributes(net.giant_component_int, membership, name="cluster")
+    net.add_attributes({"cluster": [membership[node] for node in range(net.graph.n_nodes)]})
 
     #membership_original = copy.deepcopy(membership)
     membership = finetune_partition(net, membership)
 
     # ATTRIBUTE 2: Finetuned partition
-    nx.set_node_attributes(net.giant_component_int, membership, name="finetuned_cluster")
+    net.add_attributes({"finetuned_cluster": [membership[node] for node in range(net.graph.n_nodes)]})
 
     if CANDIDATES_INFORMATION:
-        # ATTRIBUTE 3: Candidate information
-        id_2_candidate, id_2_party, id_2_age, id_2_sex, id_2_hometown, id_2_lang = get_candidate_mappings()
-
-        screen_name_attributes = dict()
-        party_attributes = dict()
-        sex_attributes = dict()
-        language_attributes = dict()
-
-        for node in net.giant_component_int.nodes():
-            node_user_id = net.giant_component_int.nodes[node]["user_id"]
-            try:
-                if node_user_id in id_2_candidate.keys():
-                    screen_name_attributes[node] = id_2_candidate[node_user_id].rstrip()
-                    party_attributes[node] = id_2_party[node_user_id].rstrip()
-                    sex_attributes[node] = id_2_sex[node_user_id]
-                    language_attributes[node] = id_2_lang[node_user_id]
-                else:
-                    screen_name_attributes[node] = "NA"
-                    party_attributes[node] = "NA"
-                    sex_attributes[node] = "NA"
-                    language_attributes[node] = "NA"
-            except:
-                screen_name_attributes[node] = "NA"
-                party_attributes[node] = "NA"
-                sex_attributes[node] = "NA"
-                language_attributes[node] = "NA"
-                print(f"Error with node {node_user_id}")
-
-        nx.set_node_attributes(net.giant_component_int, screen_name_attributes, "screen_name")
-        nx.set_node_attributes(net.giant_component_int, party_attributes, "party")
-        nx.set_node_attributes(net.giant_component_int, sex_attributes, "sex")
-        nx.set_node_attributes(net.giant_component_int, language_attributes, "language")
-
-    nx.write_graphml_lxml(net.giant_component_int, f"./rich-networks/{year}/RICH_{netname}_{year}_NET.graphml")
+        # ATTRIBUTE 3: Candidate information, one join of the node table with the candidate table
+        nodes = pd.DataFrame({"user_id": np.asarray(net.graph.node_ids, dtype=str)})
+        enriched = nodes.merge(load_candidate_table(), on="user_id", how="left")
+        net.add_attributes({name: enriched[name].fillna("NA").to_numpy() for name in CANDIDATE_ATTRIBUTES})
+
+    # The NetworkX graph only exists for writing the GraphML file
+    nx.write_graphml_lxml(net.graph.to_networkx(), f"./rich-networks/{year}/RICH_{netname}_{year}_NET.graphml")
 
 
 if __name__ == "__main__":
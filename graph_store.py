@@ -0,0 +1,734 @@
+'''
+    File name: graph_store.py
+    Description: Compact CSR representation of the retweet networks, a
+                 binary cache next to the GraphML files and helpers for
+                 sharing graphs between worker processes.
+    Python Version: 3.8
+'''
+import os
+import errno
+import json
+import shutil
+import logging
+import tempfile
+from array import array
+from multiprocessing import shared_memory
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
+
+
+class CSRGraph():
+    """
+    Adjacency of a graph in compressed sparse row form.
+
+    Nodes are the integers 0..n_nodes-1. The neighbours of node i are
+    indices[indptr[i]:indptr[i+1]]. For undirected graphs every edge is stored
+    in both directions.
+
+    Attributes:
+        indptr (numpy.ndarray): Row pointer array of length n_nodes + 1.
+        indices (numpy.ndarray): Column indices (neighbours) of length indptr[-1].
+        node_ids (numpy.ndarray): Original identifier of every node, or None.
+        weights (numpy.ndarray): Edge weights aligned with indices, or None.
+        attributes (dict): Node attribute columns, each aligned with the node order.
+        directed (bool): Whether the adjacency holds out-edges of a directed graph.
+    """
+
+    def __init__(self, indptr, indices, node_ids=None, weights=None, attributes=None, directed=False):
+        self.indptr = indptr
+        self.indices = indices
+        self.node_ids = node_ids
+        self.weights = weights
+        self.attributes = attributes if attributes is not None else dict()
+        self.directed = directed
+
+    @property
+    def n_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self):
+        n_entries = int(self.indptr[-1])
+        return n_entries if self.directed else n_entries // 2
+
+    def degree(self):
+        """Returns the (out-)degree of every node as an array."""
+        return np.diff(self.indptr)
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def to_networkx(self, node_type=None):
+        """
+        Builds a NetworkX graph with the same nodes, edges and node attributes.
+
+        Args:
+            node_type (callable, optional): If given, nodes are labelled with
+                node_type(node_id) instead of their integer position.
+
+        Returns:
+            networkx.Graph or networkx.DiGraph: The converted graph.
+        """
+        G = nx.DiGraph() if self.directed else nx.Graph()
+
+        if node_type is not None and self.node_ids is not None:
+            labels = [node_type(x) for x in self.node_ids.tolist()]
+        else:
+            labels = list(range(self.n_nodes))
+
+        G.add_nodes_from(labels)
+        for name, column in self.attributes.items():
+            nx.set_node_attributes(G, dict(zip(labels, column.tolist())), name)
+
+        rows = np.repeat(np.arange(self.n_nodes), self.degree())
+        if not self.directed:
+            keep = rows <= self.indices
+        else:
+            keep = slice(None)
+
+        sources = rows[keep].tolist()
+        targets = self.indices[keep].tolist()
+
+        if self.weights is None:
+            G.add_edges_from((labels[s], labels[t]) for s, t in zip(sources, targets))
+        else:
+            weights = self.weights[keep].tolist()
+            G.add_weighted_edges_from((labels[s], labels[t], w) for s, t, w in zip(sources, targets, weights))
+
+        return G
+
+
+def _as_column(values):
+    """Returns a fixed-width array for an attribute column so it can be memory-mapped."""
+    column = np.asarray(values)
+    if column.dtype == object:
+        column = np.asarray(["NA" if x is None else str(x) for x in values])
+    return column
+
+def from_networkx(G, attributes=()):
+    """
+    Converts a NetworkX graph into a CSRGraph.
+
+    Args:
+        G (networkx.Graph): The graph to convert. Nodes keep their iteration order.
+        attributes (iterable, optional): Names of node attributes to copy as columns.
+
+    Returns:
+        CSRGraph: The graph in CSR form, with the original node labels in node_ids.
+    """
+    nodelist = list(G.nodes)
+    A = nx.to_scipy_sparse_array(G, nodelist=nodelist, weight=None, format="csr")
+
+    columns = dict()
+    for name in attributes:
+        columns[name] = _as_column([G.nodes[n].get(name) for n in nodelist])
+
+    return CSRGraph(indptr=A.indptr.astype(np.int64),
+                    indices=A.indices.astype(np.int32),
+                    node_ids=np.asarray(nodelist),
+                    attributes=columns,
+                    directed=G.is_directed())
+
+def from_edge_arrays(sources, targets, n_nodes, directed=True, weights=None):
+    """
+    Builds the CSR adjacency from parallel arrays of edge endpoints.
+
+    Duplicate edges are merged: their weights are summed when weights are
+    given, otherwise the graph stays unweighted. Undirected graphs store
+    every edge in both directions.
+
+    Returns:
+        tuple: indptr, indices and weights (None for unweighted graphs).
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    data = np.ones(len(sources), dtype=np.int64) if weights is None else np.asarray(weights)
+
+    if not directed:
+        sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+        data = np.concatenate([data, data])
+        # Self-loops were mirrored onto themselves and must be counted once.
+        data = np.where(sources == targets, data / 2, data) if weights is not None else data
+
+    A = scipy.sparse.csr_array((data, (sources, targets)), shape=(n_nodes, n_nodes))
+    A.sum_duplicates()
+
+    return (A.indptr.astype(np.int64),
+            A.indices.astype(np.int32),
+            None if weights is None else A.data)
+
+def prepare_graph(graph, remove_self_loops=True):
+    """
+    Turns a loaded network into the graph the polarization measures run on.
+
+    The graph is made undirected, self-loops are removed (unless
+    remove_self_loops is False) and only the giant component is kept, with
+    its nodes relabelled 0..n-1 in their original order. Everything happens
+    on the sparse arrays; no intermediate graph copies are created.
+
+    Args:
+        graph (CSRGraph): The loaded network, directed or undirected.
+        remove_self_loops (bool, optional): Defaults to True. A kept self-loop
+            is stored once in the row of its node.
+
+    Returns:
+        CSRGraph: The undirected giant component. node_ids maps every new
+        integer label back to the original node id and node attribute
+        columns are carried over.
+    """
+    n_nodes = graph.n_nodes
+    rows = np.repeat(np.arange(n_nodes, dtype=np.int64), np.diff(graph.indptr))
+    cols = np.asarray(graph.indices, dtype=np.int64)
+
+    if remove_self_loops:
+        not_loop = rows != cols
+        rows, cols = rows[not_loop], cols[not_loop]
+        del not_loop
+    indptr, indices, _ = from_edge_arrays(rows, cols, n_nodes, directed=False)
+    del rows, cols
+
+    A = scipy.sparse.csr_array((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n_nodes, n_nodes))
+    _, labels = connected_components(A, directed=False)
+    giant = labels == np.argmax(np.bincount(labels))
+
+    A = A[giant][:, giant]
+    A.sort_indices()
+
+    node_ids = graph.node_ids[giant] if graph.node_ids is not None else np.flatnonzero(giant)
+
+    return CSRGraph(indptr=A.indptr.astype(np.int64),
+                    indices=A.indices.astype(np.int32),
+                    node_ids=np.asarray(node_ids),
+                    attributes={name: np.asarray(column)[giant] for name, column in graph.attributes.items()},
+                    directed=False)
+
+def from_edgelist(sources, targets, directed=True):
+    """
+    Builds a weighted graph from raw edge endpoint columns in one vectorized step.
+
+    User ids are factorized into dense integers in order of first appearance
+    (the node order nx.from_pandas_edgelist would give) and repeated retweets
+    between the same pair of users are aggregated into an integer weight.
+
+    Args:
+        sources (array-like): Source user id of every edge.
+        targets (array-like): Target user id of every edge.
+        directed (bool, optional): Whether to build a directed graph. Defaults to True.
+
+    Returns:
+        CSRGraph: The weighted graph, with the user ids in node_ids.
+    """
+    endpoints = np.column_stack([np.asarray(sources), np.asarray(targets)]).ravel()
+    codes, node_ids = pd.factorize(endpoints)
+    codes = codes.reshape(-1, 2)
+
+    indptr, indices, weights = from_edge_arrays(codes[:, 0], codes[:, 1], len(node_ids),
+                                                directed=directed,
+                                                weights=np.ones(len(codes), dtype=np.int64))
+
+    return CSRGraph(indptr=indptr,
+                    indices=indices,
+                    node_ids=np.asarray(node_ids),
+                    weights=weights.astype(np.int64),
+                    directed=directed)
+
+_GRAPHML_HEADER = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                   '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+                   'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                   'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns '
+                   'http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+
+def write_graphml(graph, filename, chunk_size=100000):
+    """
+    Writes a CSRGraph as GraphML without going through networkx.
+
+    Edges are formatted in chunks straight from the CSR arrays. Weighted graphs
+    get a "weight" edge attribute and node attribute columns are written as
+    node data, so nx.read_graphml reads the file back as before.
+
+    Args:
+        graph (CSRGraph): The graph to write.
+        filename (str): Path of the GraphML file.
+        chunk_size (int, optional): Number of nodes or edges formatted at a time.
+    """
+    if graph.node_ids is not None:
+        labels = np.asarray(graph.node_ids).astype(str)
+    else:
+        labels = np.arange(graph.n_nodes).astype(str)
+    labels = np.asarray([quoteattr(x) for x in labels.tolist()])
+
+    attribute_types = dict()
+    for name, column in graph.attributes.items():
+        if np.issubdtype(column.dtype, np.integer):
+            attribute_types[name] = "long"
+        elif np.issubdtype(column.dtype, np.floating):
+            attribute_types[name] = "double"
+        else:
+            attribute_types[name] = "string"
+
+    rows = np.repeat(np.arange(graph.n_nodes), graph.degree())
+    keep = slice(None) if graph.directed else rows <= graph.indices
+    sources = rows[keep]
+    targets = np.asarray(graph.indices)[keep]
+    weights = np.asarray(graph.weights)[keep] if graph.weights is not None else None
+
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(_GRAPHML_HEADER)
+
+        for i, (name, attr_type) in enumerate(attribute_types.items()):
+            f.write(f'  <key id="d{i}" for="node" attr.name={quoteattr(name)} attr.type="{attr_type}" />\n')
+        if weights is not None:
+            f.write('  <key id="weight" for="edge" attr.name="weight" attr.type="long" />\n')
+
+        edgedefault = "directed" if graph.directed else "undirected"
+        f.write(f'  <graph edgedefault="{edgedefault}">\n')
+
+        for start in range(0, graph.n_nodes, chunk_size):
+            lines = []
+            for node in range(start, min(start + chunk_size, graph.n_nodes)):
+                data = "".join(f'<data key="d{i}">{escape(str(graph.attributes[name][node]))}</data>'
+                               for i, name in enumerate(attribute_types))
+                if data:
+                    lines.append(f'    <node id={labels[node]}>{data}</node>\n')
+                else:
+                    lines.append(f'    <node id={labels[node]} />\n')
+            f.write("".join(lines))
+
+        for start in range(0, len(sources), chunk_size):
+            s_chunk = labels[sources[start:start + chunk_size]].tolist()
+            t_chunk = labels[targets[start:start + chunk_size]].tolist()
+            if weights is None:
+                f.write("".join(f'    <edge source={s} target={t} />\n' for s, t in zip(s_chunk, t_chunk)))
+            else:
+                w_chunk = weights[start:start + chunk_size].tolist()
+                f.write("".join(f'    <edge source={s} target={t}><data key="weight">{w}</data></edge>\n'
+                                for s, t, w in zip(s_chunk, t_chunk, w_chunk)))
+
+        f.write("  </graph>\n</graphml>\n")
+
+# Streaming GraphML reader
+
+_GRAPHML_TYPES = {"int": int,
+                  "long": int,
+                  "float": float,
+                  "double": float,
+                  "string": str,
+                  "boolean": lambda x: x.lower() in ("true", "1")}
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def read_graphml_stream(filename, attributes=None, edge_weight=None):
+    """
+    Reads a GraphML file incrementally into a CSRGraph.
+
+    Unlike nx.read_graphml, the document is never materialized: node and edge
+    elements are dropped as soon as they have been read, edges go straight into
+    integer arrays and only the requested node attributes are kept.
+
+    Args:
+        filename (str): Path of the GraphML file.
+        attributes (iterable, optional): Names of node attributes to keep.
+            Defaults to None, which keeps every node attribute.
+        edge_weight (str, optional): Name of an edge attribute to read as edge weight.
+
+    Returns:
+        CSRGraph: The graph, with the GraphML node ids in node_ids.
+    """
+    keep = None if attributes is None else set(attributes)
+
+    node_keys = dict()
+    weight_key = None
+    directed = True
+
+    node_index = dict()
+    # Attribute name -> (node indices, values), turned into one column at the end
+    columns = dict()
+    sources = array("q")
+    targets = array("q")
+    weights = array("d")
+
+    def get_index(node_id):
+        if node_id not in node_index:
+            node_index[node_id] = len(node_index)
+        return node_index[node_id]
+
+    graph_elem = None
+
+    for event, elem in ElementTree.iterparse(filename, events=("start", "end")):
+        tag = _local_name(elem.tag)
+
+        if event == "start":
+            if tag == "graph" and graph_elem is None:
+                graph_elem = elem
+                directed = elem.get("edgedefault", "directed") == "directed"
+            continue
+
+        if tag == "key":
+            name, domain = elem.get("attr.name"), elem.get("for")
+            convert = _GRAPHML_TYPES.get(elem.get("attr.type"), str)
+            if domain == "node" and (keep is None or name in keep):
+                node_keys[elem.get("id")] = (name, convert)
+            elif domain == "edge" and name == edge_weight:
+                weight_key = (elem.get("id"), convert)
+
+        elif tag == "node":
+            index = get_index(elem.get("id"))
+            for data in elem:
+                if data.get("key") in node_keys:
+                    name, convert = node_keys[data.get("key")]
+                    positions, values = columns.setdefault(name, ([], []))
+                    positions.append(index)
+                    values.append(convert(data.text or ""))
+            graph_elem.clear()
+
+        elif tag == "edge":
+            sources.append(get_index(elem.get("source")))
+            targets.append(get_index(elem.get("target")))
+            if weight_key is not None:
+                value = 1.0
+                for data in elem:
+                    if data.get("key") == weight_key[0]:
+                        value = weight_key[1](data.text)
+                weights.append(value)
+            graph_elem.clear()
+
+    n_nodes = len(node_index)
+    indptr, indices, edge_weights = from_edge_arrays(np.frombuffer(sources, dtype=np.int64),
+                                                     np.frombuffer(targets, dtype=np.int64),
+                                                     n_nodes,
+                                                     directed=directed,
+                                                     weights=np.frombuffer(weights) if weight_key is not None else None)
+
+    node_ids = np.empty(n_nodes, dtype=object)
+    for node_id, index in node_index.items():
+        node_ids[index] = node_id
+
+    attribute_columns = dict()
+    for name, (positions, values) in columns.items():
+        # Nodes without a value get None, stored as "NA"
+        column = np.full(n_nodes, None, dtype=object)
+        column[np.asarray(positions, dtype=np.int64)] = values
+        attribute_columns[name] = _as_column(column.tolist())
+
+    return CSRGraph(indptr=indptr,
+                    indices=indices,
+                    node_ids=node_ids.astype(str),
+                    weights=edge_weights,
+                    attributes=attribute_columns,
+                    directed=directed)
+
+# Binary cache
+
+CACHE_VERSION = 2
+
+def cache_path(filename):
+    """Returns the directory holding the binary cache of a GraphML file."""
+    return filename + ".csr"
+
+def _source_stamp(filename):
+    stat = os.stat(filename)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+def read_cache_meta(filename):
+    """Returns the meta.json of the binary cache of a GraphML file, or None if it cannot be read."""
+    try:
+        with open(os.path.join(cache_path(filename), "meta.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_cache_fresh(filename):
+    """Checks whether the binary cache exists and was written from the current GraphML file."""
+    # None when missing, or being replaced by another process
+    meta = read_cache_meta(filename)
+    if meta is None:
+        return False
+
+    stamp = _source_stamp(filename)
+    return (meta.get("version") == CACHE_VERSION
+            and meta.get("source_size") == stamp["source_size"]
+            and meta.get("source_mtime_ns") == stamp["source_mtime_ns"])
+
+def write_graph_cache(graph, filename, all_attributes=True):
+    """
+    Writes a graph into the binary cache next to its GraphML file.
+
+    The cache is a directory of .npy files (indptr, indices, node ids, optional
+    weights and one file per node attribute) plus a meta.json recording the
+    size and modification time of the GraphML file it was built from, the
+    cached attributes and whether they are all the attributes of the file.
+    The cache is written into a temporary directory unique to the writer and
+    swapped in afterwards, so processes loading the same network at the same
+    time never see a partial cache; a reader losing the cache in the swap
+    parses the GraphML file instead (see load_graph).
+
+    Args:
+        graph (CSRGraph): The graph parsed from filename.
+        filename (str): Path of the GraphML file the graph was read from.
+        all_attributes (bool, optional): Whether graph holds every node attribute
+            of the file, or only some of them. Defaults to True.
+    """
+    path = cache_path(filename)
+    parent, base = os.path.split(os.path.abspath(path))
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=base + ".tmp")
+    os.chmod(tmp_path, 0o755)
+
+    try:
+        _write_cache_files(graph, filename, tmp_path, all_attributes)
+        replace_directory(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def replace_directory(tmp_path, path):
+    """
+    Swaps a directory written in tmp_path into path, replacing the one there.
+
+    A directory can only be renamed onto an empty one, so the old directory is
+    first moved aside under a unique name and removed. When another writer
+    swaps its own directory in meanwhile, that one is moved aside in turn, so
+    the last writer wins. Readers may briefly find no directory at path.
+
+    Args:
+        tmp_path (str): The new directory, in the same parent directory as path.
+        path (str): The destination.
+    """
+    parent, base = os.path.split(os.path.abspath(path))
+    while True:
+        if os.path.exists(path):
+            old_path = tempfile.mkdtemp(dir=parent, prefix=base + ".old")
+            try:
+                os.replace(path, old_path)
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(old_path, ignore_errors=True)
+
+        try:
+            os.replace(tmp_path, path)
+            return
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+
+def _write_cache_files(graph, filename, tmp_path, all_attributes):
+    np.save(os.path.join(tmp_path, "indptr.npy"), graph.indptr)
+    np.save(os.path.join(tmp_path, "indices.npy"), graph.indices)
+    np.save(os.path.join(tmp_path, "node_ids.npy"), graph.node_ids)
+    if graph.weights is not None:
+        np.save(os.path.join(tmp_path, "weights.npy"), graph.weights)
+    for name, column in graph.attributes.items():
+        np.save(os.path.join(tmp_path, f"attr_{name}.npy"), column)
+
+    meta = {"version": CACHE_VERSION,
+            "directed": graph.directed,
+            "weighted": graph.weights is not None,
+            "attributes": list(graph.attributes),
+            "all_attributes": all_attributes}
+    meta.update(_source_stamp(filename))
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+def read_graph_cache(filename, attributes=None, mmap=True):
+    """
+    Reads a graph from the binary cache of a GraphML file.
+
+    Args:
+        filename (str): Path of the GraphML file whose cache is read.
+        attributes (iterable, optional): Node attributes to load. Defaults to all attributes.
+        mmap (bool, optional): Memory-map the arrays instead of reading them. Defaults to True.
+
+    Returns:
+        CSRGraph: The cached graph.
+
+    Raises:
+        KeyError: If the cache does not hold the requested attributes.
+    """
+    path = cache_path(filename)
+    mmap_mode = "r" if mmap else None
+
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+
+    def load(name):
+        return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+
+    if attributes is None:
+        if not meta.get("all_attributes"):
+            raise KeyError("The cache only holds some of the node attributes")
+        attributes = meta["attributes"]
+
+    missing = [name for name in attributes if name not in meta["attributes"]]
+    if missing:
+        raise KeyError(f"Node attributes not cached: {missing}")
+
+    return CSRGraph(indptr=load("indptr.npy"),
+                    indices=load("indices.npy"),
+                    node_ids=load("node_ids.npy"),
+                    weights=load("weights.npy") if meta["weighted"] else None,
+                    attributes={name: load(f"attr_{name}.npy") for name in attributes},
+                    directed=meta["directed"])
+
+def parse_graphml(filename, attributes=None):
+    """Parses a GraphML file into a CSRGraph keeping the given node attributes (default all)."""
+    return read_graphml_stream(filename, attributes=attributes)
+
+def load_graph(filename, attributes=None, use_cache=True):
+    """
+    Loads a GraphML network, going through the binary cache when it is fresh.
+
+    On a cache miss the GraphML file is parsed once and the cache is (re)written
+    next to it, so later loads only memory-map the arrays. Only the requested
+    node attributes are parsed and cached, together with those the cache already
+    held; a later load asking for other attributes parses the file again.
+
+    Args:
+        filename (str): Path of the GraphML file.
+        attributes (iterable, optional): Node attributes to return. Defaults to all.
+        use_cache (bool, optional): Set to False to always parse the GraphML file.
+
+    Returns:
+        CSRGraph: The loaded graph. Node ids are the GraphML node ids as strings.
+
+    Raises:
+        KeyError: If a requested attribute is not in the file.
+    """
+    cached = None
+    if use_cache and is_cache_fresh(filename):
+        try:
+            graph = read_graph_cache(filename, attributes=attributes)
+            logging.info(f"Loaded {filename} from the binary cache.")
+            return graph
+        except KeyError as e:
+            cached = read_cache_meta(filename)
+            if cached is not None and cached.get("all_attributes"):
+                # The cache holds every attribute of the file, so the file does not have them
+                raise
+            logging.info(f"The binary cache of {filename} lacks node attributes ({e}), parsing it instead.")
+        except (OSError, ValueError) as e:
+            # The cache was removed or replaced by another process while being read
+            logging.info(f"Could not read the binary cache of {filename} ({e}), parsing it instead.")
+
+    # Attributes already cached are parsed again so that rewriting the cache keeps them
+    parsed_attributes = None
+    all_attributes = attributes is None
+    if attributes is not None:
+        parsed_attributes = list(attributes)
+        if cached is not None:
+            parsed_attributes += [name for name in cached["attributes"] if name not in parsed_attributes]
+            all_attributes = bool(cached.get("all_attributes"))
+
+    logging.info(f"Parsing {filename}.")
+    graph = parse_graphml(filename, attributes=parsed_attributes)
+
+    if use_cache:
+        try:
+            write_graph_cache(graph, filename, all_attributes=all_attributes)
+        except OSError as e:
+            logging.info(f"Could not write the binary cache of {filename}: {e}")
+
+    if attributes is not None:
+        graph.attributes = {name: graph.attributes[name] for name in attributes}
+
+    return graph
+
+# Shared memory
+
+_SHARED_HEADER = 4
+
+class SharedGraph():
+    """
+    Owner of a graph exported into a single shared memory block.
+
+    The shared graph is meant for worker processes that only need the
+    structure of a graph (node and edge counts, degrees, adjacency and an
+    optional integer membership), such as the null-model samplers of the
+    randomization pipeline. The block holds a small int64 header followed by
+    the indptr, indices, membership and degree arrays. Node ids are not
+    exported, as they may be strings: nodes are the integers 0..n_nodes-1 of the
+    exporting graph, whose node_ids map them back to the original ids.
+    Worker processes attach to it with attach_shared_graph(name) and read the
+    arrays without copying them. The creating process must call close() and
+    unlink() once the workers are done.
+    """
+
+    def __init__(self, graph, membership=None):
+        n_nodes = graph.n_nodes
+        n_entries = int(graph.indptr[-1])
+
+        if membership is None:
+            membership = np.full(n_nodes, -1, dtype=np.int32)
+
+        arrays = [np.asarray(graph.indptr, dtype=np.int64),
+                  np.asarray(graph.indices, dtype=np.int32),
+                  np.asarray(membership, dtype=np.int32),
+                  np.asarray(graph.degree(), dtype=np.int64)]
+
+        header = np.asarray([n_nodes, n_entries, int(graph.directed), 0], dtype=np.int64)
+        size = header.nbytes + sum(a.nbytes for a in arrays)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+
+        offset = 0
+        for a in [header] + arrays:
+            view = np.ndarray(a.shape, dtype=a.dtype, buffer=self.shm.buf, offset=offset)
+            view[:] = a
+            offset += a.nbytes
+
+        logging.info(f"Exported graph with {n_nodes} nodes into shared memory block {self.name} ({size} bytes).")
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _shared_layout(buf):
+    header = np.ndarray((_SHARED_HEADER,), dtype=np.int64, buffer=buf)
+    n_nodes, n_entries, directed = int(header[0]), int(header[1]), bool(header[2])
+
+    specs = [("indptr", n_nodes + 1, np.int64),
+             ("indices", n_entries, np.int32),
+             ("membership", n_nodes, np.int32),
+             ("degree", n_nodes, np.int64)]
+
+    arrays = dict()
+    offset = header.nbytes
+    for name, length, dtype in specs:
+        a = np.ndarray((length,), dtype=dtype, buffer=buf, offset=offset)
+        a.flags.writeable = False
+        arrays[name] = a
+        offset += a.nbytes
+
+    return arrays, directed
+
+
+def attach_shared_graph(name):
+    """
+    Attaches read-only to a graph exported with SharedGraph.
+
+    Args:
+        name (str): Name of the shared memory block (SharedGraph.name).
+
+    Returns:
+        tuple: A CSRGraph whose arrays are views into the shared block (without
+        node ids, nodes are labelled 0..n_nodes-1), the membership array and the SharedMemory handle. The handle must stay
+        referenced for as long as the arrays are used.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    arrays, directed = _shared_layout(shm.buf)
+
+    graph = CSRGraph(indptr=arrays["indptr"],
+                     indices=arrays["indices"],
+                     attributes={"degree": arrays["degree"]},
+                     directed=directed)
+
+    return graph, arrays["membership"], shm
@@ -0,0 +1,856 @@
+'''
+    File name: ingestion.py
+    Description: Streaming building blocks for the data pipelines. Tweets flow
+                 lazily through decompress -> parse -> dedupe -> retweet filter
+                 and the resulting edges are appended to the edge list as they
+                 are formed, so memory stays bounded by the size of one record.
+    Python Version: 3.8
+'''
+import io
+import os
+import csv
+import gzip
+import zlib
+import json
+import math
+import sqlite3
+import hashlib
+import shutil
+import logging
+import itertools
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Decoding
+
+# Fields of a retweet record used by the pipelines, as paths into the JSON object.
+# The id is kept for deduplication.
+V2_RETWEET_FIELDS = [("id",),
+                     ("author_id",),
+                     ("created_at",),
+                     ("referenced_tweets", 0, "id"),
+                     ("referenced_tweets", 0, "type"),
+                     ("referenced_tweets", 0, "tweet", "author_id"),
+                     ("referenced_tweets", 0, "tweet", "text")]
+
+V1_RETWEET_FIELDS = [("id",),
+                     ("created_at",),
+                     ("timestamp",),
+                     ("is_quote_status",),
+                     ("user", "id"),
+                     ("retweeted_status", "id"),
+                     ("retweeted_status", "text"),
+                     ("retweeted_status", "user", "id")]
+
+def _set_path(record, path, value):
+    """Stores value at path in a nested record, creating the missing containers."""
+    node = record
+    for key, next_key in zip(path[:-1], path[1:]):
+        child = [] if isinstance(next_key, int) else dict()
+        if isinstance(node, list):
+            if not node:
+                node.append(child)
+            node = node[0]
+        else:
+            node = node.setdefault(key, child)
+
+    if isinstance(node, list):
+        node.append(value)
+    else:
+        node[path[-1]] = value
+
+class RecordDecoder():
+    """
+    Decodes JSON records keeping only selected fields.
+
+    The result has the nesting of the original object restricted to the given
+    paths (a list index, always 0, keeps a one-element list), so code indexing
+    the full object, e.g. obj["referenced_tweets"][0]["tweet"]["text"], works
+    unchanged.
+    Fields missing from a record are left out, like in the original object.
+
+    Backends:
+        "simdjson": parses lazily with pysimdjson and only materializes the
+            selected fields.
+        "orjson": parses the full object with orjson, then projects it.
+        "json": the standard library, then projects.
+    By default the fastest installed backend is used.
+
+    Args:
+        fields (list, optional): Paths of the fields to keep, e.g. V2_RETWEET_FIELDS.
+            Defaults to keeping the full object.
+        backend (str, optional): One of "simdjson", "orjson" or "json".
+    """
+
+    def __init__(self, fields = None, backend = None):
+        if backend is None:
+            backend = "simdjson" if simdjson is not None else "orjson" if orjson is not None else "json"
+        if backend == "simdjson" and (simdjson is None or fields is None):
+            backend = "orjson" if orjson is not None else "json"
+        if backend == "orjson" and orjson is None:
+            backend = "json"
+
+        self.fields = fields
+        self.backend = backend
+        if backend == "simdjson":
+            self.parser = simdjson.Parser()
+
+    def project(self, obj):
+        """Returns the selected fields of an already parsed object."""
+        if self.fields is None:
+            return obj
+
+        record = dict()
+        for path in self.fields:
+            value = obj
+            try:
+                for key in path:
+                    value = value[key]
+            except (KeyError, IndexError, TypeError):
+                continue
+
+            if hasattr(value, "as_dict"):
+                value = value.as_dict()
+            elif hasattr(value, "as_list"):
+                value = value.as_list()
+
+            _set_path(record, path, value)
+
+        return record
+
+    def decode(self, line):
+        """
+        Decodes one JSON document.
+
+        Args:
+            line (bytes or str): The JSON text.
+
+        Returns:
+            dict: The selected fields.
+        """
+        if self.backend == "simdjson":
+            return self.project(self.parser.parse(line))
+        if self.backend == "orjson":
+            return self.project(orjson.loads(line))
+        return self.project(json.loads(line))
+
+# Readers
+
+def log_salvage(path, salvaged_bytes, lost_bytes, n_records, damaged = None):
+    """Logs the records kept from a truncated file, and adds the file to the damaged set if one is given."""
+    logging.info(f"Salvaged {n_records} records ({salvaged_bytes} bytes) from truncated file {path}, {lost_bytes} bytes of an incomplete record lost.")
+    if damaged is not None:
+        damaged.add(path)
+
+def salvage_gzip_lines(path, chunk_size = 1 << 20, damaged = None):
+    """
+    Reads the complete lines of a gzip file that may be truncated.
+
+    The file is decompressed with zlib, members of a multi-member file one after
+    another. If it ends inside a member, the complete lines decompressed so far
+    are kept and the trailing partial line is reported as lost. Data rejected by
+    zlib is not a truncation: the output of a member is only verified by its CRC
+    at the end of the member, so what was decompressed before the error may be
+    garbage, and a corrupted file is rejected as a whole.
+
+    Args:
+        path (str): Path of the .gz file.
+        chunk_size (int, optional): Number of compressed bytes read at a time.
+        damaged (set, optional): The path is added to it if the file is truncated.
+
+    Yields:
+        bytes: The complete lines, with their line terminators.
+
+    Raises:
+        EOFError: If the file is corrupted.
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    in_member = False
+    pending = b""
+    salvaged_bytes = 0
+    n_lines = 0
+
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+
+            decompressed = []
+            while data:
+                # Null bytes after the last member are padding, as in the gzip module
+                if not in_member and not data.strip(b"\x00"):
+                    break
+                in_member = True
+                try:
+                    decompressed.append(decompressor.decompress(data))
+                except zlib.error as e:
+                    raise EOFError(f"Corrupted gzip file {path}: {e}") from e
+
+                data = b""
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                    in_member = False
+
+            lines = (pending + b"".join(decompressed)).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                salvaged_bytes += len(line) + 1
+                n_lines += 1
+                yield line + b"\n"
+
+    if in_member:
+        log_salvage(path, salvaged_bytes, len(pending), n_lines, damaged)
+    elif pending:
+        # A complete file may end without a line terminator
+        yield pending
+
+def _decode_lines(lines, decoder, path, salvage, damaged = None):
+    """
+    Decodes JSON lines, dropping the undecodable ones in salvage mode (and adding the path to damaged).
+
+    Raises:
+        EOFError: If a line cannot be decoded and salvage is False.
+    """
+    decode = decoder.decode if decoder is not None else json.loads
+    n_damaged = 0
+    damaged_bytes = 0
+
+    for line in lines:
+        if not line.strip():
+            continue
+        if salvage:
+            # The last line of a truncated plain file is incomplete
+            try:
+                obj = decode(line)
+            except ValueError:
+                n_damaged += 1
+                damaged_bytes += len(line)
+                continue
+        else:
+            try:
+                obj = decode(line)
+            except ValueError as e:
+                raise EOFError(f"Undecodable line in {path}: {e}") from e
+        yield obj
+
+    if n_damaged:
+        logging.info(f"{n_damaged} undecodable lines ({damaged_bytes} bytes) dropped from {path}.")
+        if damaged is not None:
+            damaged.add(path)
+
+def read_jsonl_gz(path, decoder = None, salvage = False, damaged = None):
+    """
+    Lazily reads a gzip-compressed JSON lines file.
+
+    Args:
+        path (str): Path of the .jsonl.gz file.
+        decoder (RecordDecoder, optional): Decodes each line, e.g. keeping only
+            some fields. Defaults to json.loads.
+        salvage (bool, optional): Keep the complete lines of a truncated file
+            instead of raising EOFError (see salvage_gzip_lines).
+        damaged (set, optional): The path is added to it if records were lost.
+
+    Yields:
+        dict: One parsed JSON object per line.
+
+    Raises:
+        EOFError: If the file is truncated (and salvage is False) or corrupted.
+    """
+    if salvage:
+        yield from _decode_lines(salvage_gzip_lines(path, damaged = damaged), decoder, path, salvage, damaged)
+        return
+
+    try:
+        with gzip.open(filename = path, mode = 'rb') as f_tweets:
+            yield from _decode_lines(f_tweets, decoder, path, salvage)
+    except (gzip.BadGzipFile, zlib.error) as e:
+        raise EOFError(f"Corrupted gzip file {path}: {e}") from e
+
+def read_jsonl(path, decoder = None, salvage = False, damaged = None):
+    """
+    Lazily reads a plain JSON lines file.
+
+    Args:
+        path (str): Path of the .jsonl file.
+        decoder (RecordDecoder, optional): Decodes each line, e.g. keeping only
+            some fields. Defaults to json.loads.
+        salvage (bool, optional): Drop undecodable lines, e.g. a truncated last
+            line, instead of raising.
+        damaged (set, optional): The path is added to it if lines were dropped.
+
+    Yields:
+        dict: One parsed JSON object per non-empty line.
+
+    Raises:
+        EOFError: If a line cannot be decoded and salvage is False.
+    """
+    with open(path, mode = 'rb') as f_tweets:
+        yield from _decode_lines(f_tweets, decoder, path, salvage, damaged)
+
+def _json_array_elements(read_file, path, chunk_size, decoder, salvage, damaged = None):
+    """
+    Decodes the elements of the JSON array read from a text file object.
+
+    Raises:
+        EOFError: If the array is truncated (and salvage is False) or the file is not valid UTF-8.
+    """
+    project = decoder.project if decoder is not None else (lambda obj: obj)
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    n_decoded = 0
+    n_records = 0
+
+    while True:
+        # Skip separators between the array elements
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            if buffer[position] == "[":
+                started = True
+            position += 1
+
+        if position < len(buffer) and started:
+            try:
+                obj, end = json_decoder.raw_decode(buffer, position)
+                yield project(obj)
+                if salvage:
+                    n_decoded += len(buffer[position:end].encode("utf-8"))
+                n_records += 1
+                position = end
+                continue
+            except json.JSONDecodeError as e:
+                if eof and salvage:
+                    log_salvage(path, n_decoded, len((buffer[position:]).encode("utf-8")), n_records, damaged)
+                    return
+                if eof:
+                    raise EOFError(f"Truncated or corrupted JSON array {path}: {e}") from e
+
+        if eof:
+            return
+
+        try:
+            chunk = read_file.read(chunk_size)
+        except UnicodeDecodeError as e:
+            raise EOFError(f"Corrupted file {path}: {e}") from e
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def read_json_array(path, chunk_size = 1 << 20, decoder = None, salvage = False, damaged = None):
+    """
+    Lazily reads a file holding one JSON array of objects (the API v1.1 dumps).
+
+    The file is decoded in chunks with JSONDecoder.raw_decode, so only the
+    object currently being decoded has to fit in memory.
+
+    Args:
+        path (str): Path of the .json file.
+        chunk_size (int, optional): Number of characters read at a time.
+        decoder (RecordDecoder, optional): Keeps only the fields selected by the
+            decoder of every element.
+        salvage (bool, optional): Keep the complete elements of a truncated file
+            instead of raising JSONDecodeError.
+        damaged (set, optional): The path is added to it if the file is truncated.
+
+    Yields:
+        dict: The elements of the array, in order.
+
+    Raises:
+        EOFError: If the file is truncated (and salvage is False) or corrupted.
+    """
+    with io.open(path, mode = 'r', encoding = 'utf-8') as read_file:
+        yield from _json_array_elements(read_file, path, chunk_size, decoder, salvage, damaged)
+
+# Prefetching
+
+def load_file(path, compressed = False, salvage = False, damaged = None):
+    """
+    Reads a whole shard into memory, decompressing it if needed.
+
+    Args:
+        path (str): The shard.
+        compressed (bool, optional): The shard is gzip-compressed.
+        salvage (bool, optional): Keep the complete lines of a truncated
+            compressed shard (see salvage_gzip_lines).
+        damaged (set, optional): The path is added to it if the shard is truncated.
+
+    Returns:
+        bytes: The (decompressed) content.
+
+    Raises:
+        EOFError: If a compressed shard is truncated (and salvage is False) or corrupted.
+    """
+    if compressed and salvage:
+        return b"".join(salvage_gzip_lines(path, damaged = damaged))
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if not compressed:
+        return data
+    try:
+        return gzip.decompress(data)
+    except (gzip.BadGzipFile, zlib.error) as e:
+        raise EOFError(f"Corrupted gzip file {path}: {e}") from e
+
+def prefetch(paths, load, depth = 2):
+    """
+    Loads the next shards in background threads while the current one is processed.
+
+    Reading from network storage and zlib decompression release the GIL, so
+    they overlap with the parsing and lemmatization done by the consumer. At
+    most depth shards are loaded ahead of the one being processed.
+
+    Args:
+        paths (list): The shards, in order.
+        load (callable): Reads one shard, e.g. a schema's load method.
+        depth (int, optional): Read-ahead depth. Defaults to 2.
+
+    Yields:
+        tuple: (path, future) in the order of paths. future.result() returns the
+        loaded shard or raises the exception of its loading.
+    """
+    with ThreadPoolExecutor(max_workers = depth) as executor:
+        paths = iter(paths)
+        pending = deque((path, executor.submit(load, path)) for path in itertools.islice(paths, depth))
+
+        while pending:
+            path, future = pending.popleft()
+
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(load, next_path)))
+
+            yield path, future
+
+# Schemas
+
+class V2Schema():
+    """
+    Retweets of the API v2 streams, one JSON object per line.
+
+    Args:
+        compressed (bool, optional): The files are gzip-compressed (.jsonl.gz). Defaults to True.
+        salvage (bool, optional): Keep the complete records of truncated files
+            instead of skipping them. Defaults to False. The salvaged files are
+            added to damaged.
+    """
+
+    fields = V2_RETWEET_FIELDS
+
+    def __init__(self, compressed = True, salvage = False):
+        self.compressed = compressed
+        self.salvage = salvage
+        self.decoder = RecordDecoder(self.fields)
+        self.damaged = set()
+
+    def read(self, path):
+        if self.compressed:
+            return read_jsonl_gz(path, decoder = self.decoder, salvage = self.salvage, damaged = self.damaged)
+        return read_jsonl(path, decoder = self.decoder, salvage = self.salvage, damaged = self.damaged)
+
+    def load(self, path):
+        """Reads and decompresses a whole shard, e.g. in a prefetch thread."""
+        return load_file(path, compressed = self.compressed, salvage = self.salvage, damaged = self.damaged)
+
+    def parse(self, data, path):
+        """Decodes the records of a shard returned by load."""
+        return _decode_lines(io.BytesIO(data), self.decoder, path, self.salvage, self.damaged)
+
+    def is_retweet(self, obj):
+        return "referenced_tweets" in obj and obj["referenced_tweets"][0]["type"] == "retweeted"
+
+    def text(self, obj):
+        return obj["referenced_tweets"][0]["tweet"]["text"]
+
+    def text_id(self, obj):
+        """Id of the retweeted tweet, the text of which is preprocessed."""
+        return obj["referenced_tweets"][0]["id"]
+
+    def edge(self, obj):
+        """Returns the (retweeter, retweeted, timestamp) edge of a retweet."""
+        return (obj["author_id"], obj["referenced_tweets"][0]["tweet"]["author_id"], obj["created_at"])
+
+class V1Schema():
+    """
+    Retweets of the API v1.1 dumps, one JSON array per file.
+
+    Args:
+        timestamp_field (str, optional): Field holding the retweet time as a Unix
+            timestamp. Defaults to "timestamp".
+        salvage (bool, optional): Keep the complete records of truncated files
+            instead of failing. Defaults to False. The salvaged files are added
+            to damaged.
+    """
+
+    fields = V1_RETWEET_FIELDS
+
+    def __init__(self, timestamp_field = "timestamp", salvage = False):
+        self.timestamp_field = timestamp_field
+        self.salvage = salvage
+        self.decoder = RecordDecoder(self.fields)
+        self.damaged = set()
+
+    def read(self, path):
+        return read_json_array(path, decoder = self.decoder, salvage = self.salvage, damaged = self.damaged)
+
+    def load(self, path):
+        """Reads a whole shard, e.g. in a prefetch thread."""
+        return load_file(path)
+
+    def parse(self, data, path):
+        """Decodes the records of a shard returned by load."""
+        read_file = io.TextIOWrapper(io.BytesIO(data), encoding = 'utf-8')
+        return _json_array_elements(read_file, path, 1 << 20, self.decoder, self.salvage, self.damaged)
+
+    def is_retweet(self, obj):
+        return "retweeted_status" in obj and not obj["is_quote_status"]
+
+    def text(self, obj):
+        return obj["retweeted_status"]["text"]
+
+    def text_id(self, obj):
+        """Id of the retweeted tweet, the text of which is preprocessed."""
+        return obj["retweeted_status"]["id"]
+
+    def edge(self, obj):
+        """Returns the (retweeter, retweeted, timestamp) edge of a retweet, with an ISO 8601 timestamp."""
+        dt_object = datetime.fromtimestamp(obj[self.timestamp_field])
+        return (obj["user"]["id"], obj["retweeted_status"]["user"]["id"], dt_object.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
+
+# Stream stages
+
+def record_fingerprint(obj):
+    """Returns a digest identifying the full content of a JSON object."""
+    canonical = json.dumps(obj, sort_keys = True, ensure_ascii = False)
+    return hashlib.sha1(canonical.encode("utf-8")).digest()
+
+def record_key(obj):
+    """
+    Returns the deduplication key of a tweet object.
+
+    Tweets are identified by their id ("id" in both API versions, "id_str" as a
+    fallback). Objects without an id are identified by a digest of their content.
+
+    Args:
+        obj (dict): A tweet object.
+
+    Returns:
+        bytes: The key of the object.
+    """
+    for field in ("id", "id_str"):
+        if field in obj:
+            return str(obj[field]).encode("utf-8")
+    return record_fingerprint(obj)
+
+class BloomFilter():
+    """
+    Fixed-size set of keys with a bounded false positive rate and no false negatives.
+
+    Args:
+        capacity (int): Expected number of distinct keys.
+        error_rate (float): Target false positive rate at full capacity.
+    """
+
+    def __init__(self, capacity, error_rate = 1e-6):
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size = 16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, key):
+        """Adds a key and returns True if it was (probably) not seen before."""
+        is_new = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                is_new = True
+        return is_new
+
+class Deduplicator():
+    """
+    Remembers which tweets have already been seen.
+
+    Modes:
+        "memory": exact, keeps every key in a set.
+        "bloom": a BloomFilter of fixed size. Memory stays bounded however many
+            shards are processed, at the cost of dropping a unique tweet with
+            probability error_rate.
+        "disk": exact, keeps the keys in an SQLite database at path, so memory
+            stays bounded. With reset=False the keys of earlier runs are kept.
+
+    Args:
+        mode (str, optional): One of "memory", "bloom" or "disk". Defaults to "memory".
+        path (str, optional): Database file for the "disk" mode.
+        capacity (int, optional): Expected number of tweets for the "bloom" mode.
+        error_rate (float, optional): False positive rate for the "bloom" mode.
+        reset (bool, optional): Forget the keys stored at path by earlier runs. Defaults to True.
+    """
+
+    def __init__(self, mode = "memory", path = None, capacity = 10**8, error_rate = 1e-6, reset = True):
+        self.mode = mode
+        self.n_seen = 0
+        self.n_duplicates = 0
+
+        if mode == "memory":
+            self.keys = set()
+        elif mode == "bloom":
+            self.keys = BloomFilter(capacity, error_rate)
+        elif mode == "disk":
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+            if reset:
+                self.connection.execute("DELETE FROM seen")
+            self.n_pending = 0
+        else:
+            raise ValueError(f"Unknown deduplication mode {mode}")
+
+    def is_new(self, obj):
+        """Records a tweet and returns True if it has not been seen before."""
+        key = record_key(obj)
+        self.n_seen += 1
+
+        if self.mode == "memory":
+            is_new = key not in self.keys
+            self.keys.add(key)
+        elif self.mode == "bloom":
+            is_new = self.keys.add(key)
+        else:
+            cursor = self.connection.execute("INSERT OR IGNORE INTO seen (key) VALUES (?)", (key,))
+            is_new = cursor.rowcount == 1
+            self.n_pending += 1
+            if self.n_pending >= 10000:
+                self.connection.commit()
+                self.n_pending = 0
+
+        if not is_new:
+            self.n_duplicates += 1
+        return is_new
+
+    def close(self):
+        if self.mode == "disk":
+            self.connection.commit()
+            self.connection.close()
+
+def unique_records(records, deduplicator = None):
+    """
+    Drops repeated tweets from a stream of JSON objects.
+
+    Args:
+        records (iterable): Stream of JSON objects.
+        deduplicator (Deduplicator, optional): Shared state to also drop tweets
+            seen in earlier streams. Defaults to a fresh in-memory one.
+
+    Yields:
+        dict: The first occurrence of every distinct tweet.
+    """
+    if deduplicator is None:
+        deduplicator = Deduplicator()
+
+    n_records = 0
+    n_unique = 0
+
+    for obj in records:
+        n_records += 1
+        if deduplicator.is_new(obj):
+            n_unique += 1
+            yield obj
+
+    logging.info(f"Number of json objects found is {n_records}, {n_unique} of them new.")
+
+def chain_files(paths, reader):
+    """Streams the records of several files one after another."""
+    for path in paths:
+        logging.info(f"Loading file {path} now.")
+        yield from reader(path)
+
+def process_shards_parallel(shards, process_shard, n_workers, initializer = None, initargs = ()):
+    """
+    Runs process_shard on every shard in a pool of worker processes.
+
+    Args:
+        shards (list): The shards to process, e.g. file names.
+        process_shard (callable): Top-level function taking one shard.
+        n_workers (int): Number of worker processes.
+        initializer (callable, optional): Called once in every worker, e.g. to
+            create per-process resources such as a Voikko instance.
+        initargs (tuple, optional): Arguments of the initializer.
+
+    Returns:
+        list: The results of process_shard, in the order of shards.
+    """
+    with ProcessPoolExecutor(max_workers = n_workers, initializer = initializer, initargs = initargs) as executor:
+        return list(executor.map(process_shard, shards))
+
+# Incremental ingestion
+
+def file_checksum(path, chunk_size = 1 << 20):
+    """Returns the SHA-1 hex digest of the content of a file."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ShardManifest():
+    """
+    Record of the shards already ingested into a set of edge lists.
+
+    Every ingested shard is stored with its size, modification time, checksum
+    and the number of edges it contributed to each edge list. A rerun only
+    processes the shards missing from the manifest and appends their edges.
+    A shard salvaged from a truncated file is recorded as incomplete: it is not
+    ingested again, and a repaired copy requires rebuilding the edge lists.
+    The checksum of a recorded shard is only recomputed when its size or
+    modification time changed.
+
+    Args:
+        path (str): Location of the manifest (JSON).
+        signature (str): Identifies the configuration the edge lists were built
+            with (e.g. the topics and their keywords). A manifest written with
+            another signature does not apply.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = signature
+        self.shards = dict()
+        self.pending_stats = dict()
+
+        self.compatible = False
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self.VERSION and manifest.get("signature") == signature:
+                self.compatible = True
+                self.shards = {shard["name"]: shard for shard in manifest["shards"]}
+
+    def _stat(self, path):
+        stat = os.stat(path)
+        return {"name": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def pending(self, paths):
+        """
+        Returns the shards that have not been ingested yet, in order.
+
+        Args:
+            paths (list): All shards of the corpus.
+
+        Returns:
+            list: The paths of the new shards.
+
+        Raises:
+            ValueError: If a recorded shard has changed since it was ingested,
+                as its edges cannot be removed from the edge lists.
+        """
+        new_paths = []
+        for path in paths:
+            stats = self._stat(path)
+            recorded = self.shards.get(stats["name"])
+
+            if recorded is not None:
+                unchanged = recorded["size"] == stats["size"] and \
+                    (recorded["mtime_ns"] == stats["mtime_ns"] or recorded["checksum"] == file_checksum(path))
+                if not unchanged:
+                    raise ValueError(f"Shard {path} changed after it was ingested, the edge lists have to be rebuilt from scratch")
+                if not recorded.get("complete", True):
+                    logging.info(f"Shard {path} was only partially ingested from a truncated file.")
+                continue
+
+            stats["checksum"] = file_checksum(path)
+            self.pending_stats[path] = stats
+            new_paths.append(path)
+
+        return new_paths
+
+    def record(self, path, edges, complete = True):
+        """
+        Marks a shard as ingested and saves the manifest.
+
+        The edges of the shard have to be on disk already (see EdgeWriter.sync).
+
+        Args:
+            path (str): A shard returned by pending.
+            edges (dict): Number of edges the shard contributed to each edge list.
+            complete (bool, optional): False if the shard was salvaged from a truncated file.
+        """
+        shard = dict(self.pending_stats.pop(path), edges = edges, complete = complete)
+        self.shards[shard["name"]] = shard
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok = True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.VERSION, "signature": self.signature, "shards": list(self.shards.values())}, f, indent = 2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+# Output
+
+class EdgeWriter():
+    """
+    Appends edges to a comma-separated edge list as they are formed.
+
+    The file has the same layout as DataFrame.to_csv(index=False, header=False)
+    of the (source, target, timestamp) tuples. Use as a context manager.
+    """
+
+    def __init__(self, filename, mode = "w"):
+        self.filename = filename
+        self.mode = mode
+        self.n_edges = 0
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok = True)
+        self.file = open(self.filename, self.mode, newline = "")
+        self.writer = csv.writer(self.file, lineterminator = "\n")
+        return self
+
+    def write(self, edge):
+        self.writer.writerow(edge)
+        self.n_edges += 1
+
+    def write_many(self, edges):
+        for edge in edges:
+            self.write(edge)
+
+    def append_file(self, filename):
+        """Appends the edges of another edge list file, e.g. one written by a worker process, and returns their number."""
+        with open(filename, "r", newline = "") as f:
+            n_edges = sum(1 for _ in f)
+            f.seek(0)
+            shutil.copyfileobj(f, self.file)
+        self.n_edges += n_edges
+        return n_edges
+
+    def sync(self):
+        """Flushes the edges written so far to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
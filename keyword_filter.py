@@ -0,0 +1,76 @@
+'''
+    File name: keyword_filter.py
+    Description: Cheap prefilter deciding which tweets can possibly match a
+                 topic before their text goes through the full preprocessing.
+    Python Version: 3.8
+'''
+import logging
+
+import text_processing as tp
+
+
+class KeywordPrefilter():
+    """
+    Skips the tweets proven irrelevant by the lemmas already known for their tokens.
+
+    The raw text is split with the tokenization of TextPreprocessor, and every
+    token is looked up in the lemma cache without calling Voikko. A tweet is
+    only skipped when all its tokens have a known lemma and none of them is a
+    keyword, which is exactly when check_relevancy on the preprocessed tokens
+    would reject it. A tweet with a token that has not been lemmatized yet, or
+    with a keyword lemma, is a candidate and goes through the full
+    preprocessing, so the relevancy decisions are those of the pipeline
+    without prefilter. The skipped tweets save the token cache lookups, the
+    lemmatization and the building of their token sets.
+
+    Args:
+        lemmatizer (text_cache.LemmaCache): The lemma cache of the preprocessor.
+        lemmas (iterable): Lemmatized, lowercase keywords.
+        verify (bool, optional): Check the decisions instead of skipping tweets (see record).
+    """
+
+    def __init__(self, lemmatizer, lemmas, verify = False):
+        self.lemmatizer = lemmatizer
+        self.lemmas = set(lemmas)
+
+        self.verify = verify
+        self.n_checked = 0
+        self.n_candidates = 0
+        self.n_missed = 0
+
+    def is_candidate(self, text):
+        """
+        Tells whether a text may contain one of the keywords.
+
+        Args:
+            text (str): The raw tweet text.
+
+        Returns:
+            bool: False if the text is certainly not relevant.
+        """
+        self.n_checked += 1
+        for token in tp.remove_short_tokens(tp.extract_tokens(text)):
+            lemma = self.lemmatizer.known_lemma(token)
+            if lemma is None or lemma.lower() in self.lemmas:
+                self.n_candidates += 1
+                return True
+        return False
+
+    def record(self, text, candidate, relevant):
+        """
+        Records the outcome of the full relevance check of a tweet in verify mode.
+
+        Args:
+            text (str): The raw tweet text.
+            candidate (bool): The decision of is_candidate.
+            relevant (bool): Whether the preprocessed tokens matched a keyword.
+        """
+        if relevant and not candidate:
+            self.n_missed += 1
+            if self.n_missed <= 10:
+                logging.warning(f"Keyword prefilter would drop a relevant tweet: {text!r}")
+
+    def log_stats(self):
+        logging.info(f"Keyword prefilter: {self.n_candidates} of {self.n_checked} tweets passed to preprocessing.")
+        if self.verify:
+            logging.info(f"Keyword prefilter verification: {self.n_missed} relevant tweets would have been dropped.")
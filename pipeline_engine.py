@@ -0,0 +1,431 @@
+'''
+    File name: pipeline_engine.py
+    Description: Ingestion engine shared by the data pipelines. A schema adapter
+                 (see ingestion.V2Schema and ingestion.V1Schema) describes the
+                 input format; the engine streams, deduplicates and filters the
+                 retweets of every shard, serially or in parallel, and writes the
+                 edge list and network of one or several topics.
+    Python Version: 3.8
+'''
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from contextlib import ExitStack
+from multiprocessing import util as mp_util
+
+import pandas as pd
+from tqdm import tqdm
+
+import graph_store as gs
+import edge_store as es
+import ingestion as ing
+import text_cache as tc
+import text_processing as tp
+import keyword_filter as kf
+import token_index as ti
+
+
+def save_network_data(path, network_context, user_dictionary = None):
+    """Builds the network graph from the edge list written during ingestion.
+
+    Args:
+        path (str): Path to the directory holding the edge list.
+        network_context (str): Name of the network to be saved.
+        user_dictionary (edge_store.UserDictionary, optional): Global user dictionary
+            the users of the network are added to.
+
+    Returns:
+        None
+
+    Reads the comma-separated edge list (source, target, timestamp) named
+    <network_context>_edgelist.txt, writes it into the columnar edge store
+    <network_context>_edges (see edge_store.py) and saves a GraphML file
+    containing the network graph, named <network_context>_net.graphml.
+    Repeated retweets between the same users are aggregated into an edge weight.
+    """
+
+    full_path_edgelist = os.path.join(path, network_context + "_edgelist.txt")
+    try:
+        df = pd.read_csv(full_path_edgelist, names=["source", "target", "timestamp"], dtype=str)
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=["source", "target", "timestamp"], dtype=str)
+
+    full_path_store = es.store_path(path, network_context)
+    es.write_edge_store(full_path_store, df["source"].to_numpy(), df["target"].to_numpy(), df["timestamp"].to_numpy(),
+                        user_dictionary = user_dictionary)
+    del df
+
+    # GraphML is kept for the tools reading the networks outside this repository
+    full_path_graphml = os.path.join(path, network_context + "_net.graphml")
+    G = es.EdgeStore(full_path_store).to_csr()
+    gs.write_graphml(G, full_path_graphml)
+    es.record_graphml(full_path_store, full_path_graphml)
+
+# Worker processes
+
+_worker_pipeline = None
+
+def _init_worker(pipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+    # Releases the Voikko instance, the lemma dictionary and the token cache when the worker exits
+    mp_util.Finalize(None, pipeline.close, exitpriority = 10)
+
+def _process_shard_in_worker(path):
+    return _worker_pipeline.process_shard_to_files(path)
+
+class RetweetPipeline():
+    """
+    Builds retweet networks of one or several topics from a corpus of shards.
+
+    Args:
+        schema (ingestion.V2Schema or ingestion.V1Schema): Format of the input files.
+        paths (list): The input files, processed in order.
+        output_dir (str): Directory of the edge lists and networks.
+        topics (dict): Network name -> keyword list. A network with keywords None
+            holds every retweet and needs no text preprocessing.
+        preprocessor_factory (callable, optional): Returns the text_processing.TextPreprocessor
+            used for keyword matching. Called once in every process that needs it.
+        deduplication (str, optional): Duplicates are always removed within each file.
+            Set to "memory", "bloom" or "disk" to also remove tweets repeated across
+            files (see ingestion.Deduplicator). Requires n_workers=1.
+        token_cache (str, optional): Location of a text_cache.TokenCache reused across runs.
+        prefilter (bool or str, optional): Skip the preprocessing of tweets whose tokens
+            all have a known, non-keyword lemma (see keyword_filter). Defaults to True.
+            "verify" preprocesses every tweet and logs the relevant tweets the
+            prefilter would have dropped.
+        n_workers (int, optional): Number of processes handling shards in parallel.
+        index_path (str, optional): Also index the tokens of every retweet into this
+            directory (see token_index). Requires n_workers=1.
+        run_name (str, optional): Name of the run, used for the deduplication database
+            and the manifest. Defaults to the names of the topics.
+        incremental (bool, optional): Only process the shards missing from the manifest
+            of the run (see ingestion.ShardManifest) and append their edges to the
+            existing edge lists. Cross-file deduplication then needs the "disk" mode.
+        prefetch (int, optional): Number of shards read and decompressed ahead in
+            background threads while the current one is parsed (see ingestion.prefetch).
+            0 reads each shard lazily when its turn comes. Worker processes always
+            read lazily, as they already overlap I/O with each other.
+        user_dictionary (str, optional): Location of the global user dictionary
+            (see edge_store.UserDictionary) the users of every network are added to.
+    """
+
+    def __init__(self, schema, paths, output_dir, topics, preprocessor_factory = None, deduplication = None,
+                 token_cache = None, prefilter = True, n_workers = 1, index_path = None, run_name = None, incremental = False,
+                 prefetch = 0, user_dictionary = None):
+        if n_workers > 1 and deduplication:
+            raise ValueError("Cross-file deduplication is only available with a single worker")
+        if n_workers > 1 and index_path:
+            raise ValueError("The token index can only be built with a single worker")
+        if incremental and deduplication and deduplication != "disk":
+            raise ValueError("Incremental runs keep the deduplication keys on disk, use the \"disk\" mode")
+        if incremental and index_path:
+            raise ValueError("The token index is built from all shards and cannot be updated incrementally")
+
+        self.schema = schema
+        self.paths = paths
+        self.output_dir = output_dir
+        self.topics = topics
+        self.preprocessor_factory = preprocessor_factory
+        self.deduplication = deduplication
+        self.token_cache_path = token_cache
+        self.use_prefilter = prefilter
+        self.n_workers = n_workers
+        self.index_path = index_path
+        self.run_name = run_name or "_".join(topics)
+        self.incremental = incremental
+        self.prefetch = prefetch
+        self.user_dictionary_path = user_dictionary
+
+        self.needs_text = index_path is not None or any(keywords is not None for keywords in topics.values())
+
+        self.preprocessor = None
+        self.keywords = None
+        self.prefilter = None
+        self.token_cache = None
+
+    def __getstate__(self):
+        # Per-process resources are created again in the worker processes
+        state = self.__dict__.copy()
+        state.update(preprocessor = None, keywords = None, prefilter = None, token_cache = None)
+        return state
+
+    def setup(self):
+        """Creates the per-process resources: the preprocessor, the preprocessed keywords, the prefilter and the token cache."""
+        if self.keywords is not None:
+            return
+
+        if self.needs_text:
+            self.preprocessor = self.preprocessor_factory()
+
+        self.keywords = {network_context_str: None if keywords is None else self.preprocessor.preprocess_keywords(keywords)
+                         for network_context_str, keywords in self.topics.items()}
+
+        # The index needs the tokens of every retweet, and a network without keywords every retweet
+        if self.use_prefilter and self.index_path is None and self.keywords \
+                and all(keywords is not None for keywords in self.keywords.values()):
+            self.prefilter = kf.KeywordPrefilter(self.preprocessor.lemmatizer,
+                                                 set().union(*self.keywords.values()),
+                                                 verify = self.use_prefilter == "verify")
+
+        if self.token_cache_path is not None:
+            self.token_cache = tc.TokenCache(self.token_cache_path)
+
+    def preprocess(self, retweet, text):
+        """Returns the token set of the retweeted text, from the token cache when possible."""
+        if self.token_cache is None:
+            return self.preprocessor.preprocess_text(text)
+
+        # Token sets are cached by the id of the retweeted tweet, so tweets processed
+        # by an earlier run (with any keyword list) skip tokenization and lemmatization
+        tweet_id = self.schema.text_id(retweet)
+        tokens = self.token_cache.get(tweet_id)
+        if tokens is None:
+            tokens = self.preprocessor.preprocess_text(text)
+            self.token_cache.put(tweet_id, tokens)
+        return tokens
+
+    def process_shard(self, path, deduplicator = None, index_builder = None, loaded = None):
+        """
+        Forms the relevant edges of one shard.
+
+        Args:
+            path (str): The input file.
+            deduplicator (ingestion.Deduplicator, optional): Shared state for cross-file deduplication.
+            index_builder (token_index.TokenIndexBuilder, optional): Receives every retweet
+                of the shard, relevant or not, with its tokens.
+            loaded (concurrent.futures.Future, optional): The content of the shard
+                being loaded by a prefetch thread. Defaults to reading the file lazily.
+
+        Returns:
+            dict: Network name -> (source, target, timestamp) edges of the shard,
+            or None if the shard is corrupted.
+        """
+        self.setup()
+
+        shard_edges = {network_context_str: [] for network_context_str in self.topics}
+        shard_rows = []
+
+        try:
+            records = self.schema.read(path) if loaded is None else self.schema.parse(loaded.result(), path)
+
+            for retweet in ing.unique_records(records, deduplicator):
+
+                if not self.schema.is_retweet(retweet):
+                    continue
+
+                TEXT_TOKENS = None
+                if self.needs_text:
+                    tweet_text = self.schema.text(retweet)
+
+                    candidate = True
+                    if self.prefilter is not None:
+                        candidate = self.prefilter.is_candidate(tweet_text)
+                        if not candidate and not self.prefilter.verify:
+                            continue
+
+                    TEXT_TOKENS = self.preprocess(retweet, tweet_text)
+
+                relevant_networks = [network_context_str for network_context_str, keywords in self.keywords.items()
+                                     if keywords is None or tp.check_relevancy(TEXT_TOKENS, keywords)]
+
+                if self.prefilter is not None and self.prefilter.verify:
+                    self.prefilter.record(tweet_text, candidate, bool(relevant_networks))
+
+                if relevant_networks or index_builder is not None:
+                    edge = self.schema.edge(retweet)
+
+                    if index_builder is not None:
+                        shard_rows.append(edge + (TEXT_TOKENS,))
+
+                    for network_context_str in relevant_networks:
+                        shard_edges[network_context_str].append(edge)
+
+        except EOFError as e:
+            # The readers raise EOFError for every truncated or corrupted file
+            logging.info(f"Corrupted file {path} ({e}). Moving on to the next file.")
+            return None
+
+        for row in shard_rows:
+            index_builder.add(*row)
+
+        return shard_edges
+
+    def process_shard_to_files(self, path):
+        """
+        Forms the edges of one shard in a worker process and writes them to per-shard edge files.
+
+        Returns:
+            tuple: Network name -> edge file of the shard, or None if the shard is
+            corrupted, and whether the shard was read completely (not salvaged).
+        """
+        shard_edges = self.process_shard(path)
+
+        shard_files = None
+        if shard_edges is not None:
+            shard_files = dict()
+            for network_context_str, edges in shard_edges.items():
+                # Shards with the same file name (e.g. in different directories) get separate edge files
+                shard_dir = os.path.join(self.output_dir, "shards", network_context_str)
+                os.makedirs(shard_dir, exist_ok = True)
+                fd, shard_file = tempfile.mkstemp(dir = shard_dir, prefix = os.path.basename(path) + "_", suffix = "_edgelist.txt")
+                os.close(fd)
+                with ing.EdgeWriter(shard_file) as shard_writer:
+                    shard_writer.write_many(edges)
+                shard_files[network_context_str] = shard_file
+
+        if self.preprocessor is not None:
+            self.preprocessor.lemmatizer.log_stats()
+            self.preprocessor.lemmatizer.flush()
+        if self.prefilter is not None:
+            self.prefilter.log_stats()
+        if self.token_cache is not None:
+            self.token_cache.flush()
+
+        return shard_files, path not in self.schema.damaged
+
+    def close(self):
+        """Logs the statistics of the per-process resources and releases them."""
+        if self.prefilter is not None:
+            self.prefilter.log_stats()
+        if self.token_cache is not None:
+            self.token_cache.log_stats()
+            self.token_cache.close()
+        if self.preprocessor is not None:
+            self.preprocessor.close()
+
+    def signature(self):
+        """Identifies the topics, keywords and schema the edge lists are built with."""
+        topics = {network_context_str: None if keywords is None else sorted(set(keywords))
+                  for network_context_str, keywords in self.topics.items()}
+        description = json.dumps({"schema": type(self.schema).__name__, "topics": topics}, sort_keys = True, ensure_ascii = False)
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def run(self):
+        """Writes the edge list and the network of every topic."""
+
+        logging.info(f"Starting data pipeline for {', '.join(self.topics)}...")
+
+        paths = self.paths
+        manifest = None
+        mode = "w"
+
+        if self.incremental:
+            manifest = ing.ShardManifest(os.path.join(self.output_dir, self.run_name + "_manifest.json"), self.signature())
+            if manifest.compatible:
+                mode = "a"
+            else:
+                logging.info("No manifest of an earlier run with the same topics, ingesting all shards.")
+            paths = manifest.pending(self.paths)
+            logging.info(f"{len(self.paths) - len(paths)} shards already ingested, {len(paths)} new shards.")
+
+        def record(path, n_edges, complete):
+            if manifest is not None:
+                # The manifest must not list a shard whose edges could still be lost
+                for edge_writer in edge_writers.values():
+                    edge_writer.sync()
+                manifest.record(path, n_edges, complete = complete)
+
+        with ExitStack() as stack:
+
+            edge_writers = dict()
+            for network_context_str in self.topics:
+                full_path_edgelist = os.path.join(self.output_dir, network_context_str + "_edgelist.txt")
+                edge_writers[network_context_str] = stack.enter_context(ing.EdgeWriter(full_path_edgelist, mode = mode))
+
+            if self.n_workers > 1:
+
+                # Shards are processed in parallel and their edge files merged in shard order,
+                # which gives the same edge lists as a serial run
+                results = ing.process_shards_parallel(paths, _process_shard_in_worker, self.n_workers,
+                                                      initializer = _init_worker, initargs = (self,))
+
+                for path, (shard_files, complete) in zip(paths, results):
+                    if shard_files is None:
+                        continue
+                    n_edges = dict()
+                    for network_context_str, shard_file in shard_files.items():
+                        n_edges[network_context_str] = edge_writers[network_context_str].append_file(shard_file)
+                        os.remove(shard_file)
+                    record(path, n_edges, complete)
+
+                # The shard files are removed as they are merged, leaving only empty directories
+                shard_dirs = [os.path.join(self.output_dir, "shards", network_context_str) for network_context_str in self.topics]
+                for shard_dir in shard_dirs + [os.path.join(self.output_dir, "shards")]:
+                    try:
+                        os.rmdir(shard_dir)
+                    except OSError:
+                        pass
+
+            else:
+
+                deduplicator = None
+                if self.deduplication:
+                    deduplicator = ing.Deduplicator(mode = self.deduplication,
+                                                    path = os.path.join(self.output_dir, self.run_name + "_seen.sqlite"),
+                                                    reset = mode == "w")
+
+                index_builder = ti.TokenIndexBuilder(self.index_path) if self.index_path else None
+
+                if self.prefetch > 0:
+                    shards = ing.prefetch(paths, self.schema.load, self.prefetch)
+                else:
+                    shards = ((path, None) for path in paths)
+
+                for path, loaded in tqdm(shards, total = len(paths)):
+
+                    logging.info(f"Loading file {path} now.")
+
+                    # Edges of a shard are written only once the shard has been read completely
+                    shard_edges = self.process_shard(path, deduplicator, index_builder, loaded)
+
+                    if shard_edges is not None:
+                        for network_context_str, edges in shard_edges.items():
+                            edge_writers[network_context_str].write_many(edges)
+                        record(path, {network_context_str: len(edges) for network_context_str, edges in shard_edges.items()},
+                               path not in self.schema.damaged)
+                        logging.info("Data processed successfully")
+
+                if deduplicator is not None:
+                    logging.info(f"{deduplicator.n_duplicates} duplicate tweets were removed across files.")
+                    deduplicator.close()
+
+                if index_builder is not None:
+                    index_builder.write()
+
+                self.close()
+
+        self.save_networks({network_context_str: edge_writer.n_edges for network_context_str, edge_writer in edge_writers.items()})
+
+    def save_networks(self, n_edges):
+        """Builds the edge store and the network of every topic from its edge list, with n_edges the number of edges per topic."""
+        user_dictionary = es.UserDictionary(self.user_dictionary_path) if self.user_dictionary_path else None
+
+        for network_context_str, n in n_edges.items():
+            logging.info(f"Edge formation done successfully. {n} relevant edges were formed for {network_context_str}.")
+            save_network_data(self.output_dir, network_context_str, user_dictionary = user_dictionary)
+            logging.info(f"Network {network_context_str} data saved successfully")
+
+        if user_dictionary is not None:
+            user_dictionary.log_stats()
+
+    def run_from_index(self, index_path):
+        """Writes the edge list and the network of every topic from a token index instead of the raw data."""
+        if any(keywords is None for keywords in self.topics.values()):
+            raise ValueError("Every network built from a token index needs keywords")
+
+        self.setup()
+        index = ti.TokenIndex(index_path)
+        os.makedirs(self.output_dir, exist_ok = True)
+
+        n_edges = dict()
+        for network_context_str, keywords in self.keywords.items():
+
+            # The edge list is a query over the posting lists of the keywords
+            full_path_edgelist = os.path.join(self.output_dir, network_context_str + "_edgelist.txt")
+            n_edges[network_context_str] = index.write_edgelist(keywords, full_path_edgelist)
+
+        self.close()
+        self.save_networks(n_edges)
@@ -8,6 +8,8 @@ import networkx as nx
 import pymetis
 
 import polarization_algorithms as pol
+import graph_store as gs
+import edge_store as es
 
 import argparse
 parser = argparse.ArgumentParser()
@@ -22,17 +24,11 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 def prepare_network(filename):
 
-    # Load the graph from the GraphML file
-    G = nx.read_graphml(filename, node_type=int)
+    # Load the graph from its edge store (or the GraphML file and its binary cache)
+    graph = es.load_graph(filename, attributes=[])
 
-    # Remove self-loops
-    G.remove_edges_from(nx.selfloop_edges(G))
-
-    # Get the giant component
-    giant_component = max(nx.connected_components(G), key=len)
-
-    # Create a new graph with only the giant component
-    GC = G.subgraph(giant_component).copy()
+    # Remove self-loops and keep the giant component, relabelled 0..n-1
+    GC = gs.prepare_graph(graph).to_networkx()
 
     return GC
 
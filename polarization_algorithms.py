@@ -284,8 +284,15 @@ def gmck_pol(G, ms):
 
     return GMCK
 
-def dipole_pol(G, ms):
-    """Computes Dipole Polarization"""
+def dipole_pol(G, ms, initial_polarity=None, return_polarity=False):
+    """
+    Computes Dipole Polarization
+
+    The polarity of the listeners starts from 0, or from initial_polarity
+    (node -> polarity, e.g. the polarity returned by a previous run on a
+    smaller version of the graph), which needs fewer rounds to converge.
+    With return_polarity the converged polarity of every node is also returned.
+    """
     
     left_nodes = [node for node in ms if ms[node] == 0]
     right_nodes = [node for node in ms if ms[node] == 1]
@@ -296,6 +303,8 @@ def dipole_pol(G, ms):
     Y_top = set(Y_top)
 
     dict_polarity = dict.fromkeys(list(G), 0)
+    if initial_polarity is not None:
+        dict_polarity.update((node, initial_polarity[node]) for node in G if node in initial_polarity)
 
     dict_polarity.update(zip(X_top, [-1] * len(X_top)))
     dict_polarity.update(zip(Y_top, [1] * len(Y_top)))
@@ -346,5 +355,8 @@ def dipole_pol(G, ms):
 
     pole_D = np.abs(gc_plus-gc_minus) * (1/2)
     MBLB = (1-delta_A) * pole_D
+
+    if return_polarity:
+        return MBLB, polarity
     
     return MBLB
\ No newline at end of file
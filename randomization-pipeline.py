@@ -1,6 +1,7 @@
 import logging
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 import networkx as nx
 
@@ -8,15 +9,19 @@ import pymetis
 import numpy as np
 
 import polarization_algorithms as pol
+import graph_store as gs
+import edge_store as es
 
 import argparse
 
 parser = argparse.ArgumentParser()
 parser.add_argument("network_name")
 #parser.add_argument("year")
+parser.add_argument("--workers", type=int, default=1)
 args = parser.parse_args()
 
 network_name = args.network_name
+n_workers = args.workers
 year = "2023"
 
 randomization_strategies = {"zerok": 0, "onek": 1, "twok": 0}
@@ -27,17 +32,11 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 def prepare_network(filename):
 
-    # Load the graph from the GraphML file
-    G = nx.read_graphml(filename, node_type=int)
+    # Load the graph from its edge store (or the GraphML file and its binary cache)
+    graph = es.load_graph(filename, attributes=[])
 
-    # Remove self-loops
-    G.remove_edges_from(nx.selfloop_edges(G))
-
-    # Get the giant component
-    giant_component = max(nx.connected_components(G), key=len)
-
-    # Create a new graph with only the giant component
-    GC = G.subgraph(giant_component).copy()
+    # Remove self-loops and keep the giant component, relabelled 0..n-1, as a CSR graph
+    GC = gs.prepare_graph(graph)
 
     return GC
 
@@ -62,12 +61,8 @@ def partition_metis(G):
 def compute_polarization(R, network_name):
 
     def get_giant_component(G):
-        # Get the giant component
-        giant_component = max(nx.connected_components(G), key=len)
-
-        # Create a new graph with only the giant component
-        GC = G.subgraph(giant_component).copy()
-        GC_int = nx.convert_node_labels_to_integers(GC)
+        # Get the giant component with its nodes relabelled 0..n-1
+        GC_int = gs.prepare_graph(gs.from_networkx(G)).to_networkx()
         return GC_int
 
     #logging.info(f"Starting randomization pipeline for {network_name}...")
@@ -111,39 +106,81 @@ def compute_polarization(R, network_name):
 
     return infopack
 
-def zerok(G, n_samples):
+# Parallel sampling: the observed graph is exported once into shared memory
+# and every worker attaches to it by name instead of receiving a pickled copy.
+
+_shared_observed = dict()
+
+def attach_observed_graph(shm_name):
+    graph, _, shm = gs.attach_shared_graph(shm_name)
+    _shared_observed["graph"] = graph
+    _shared_observed["shm"] = shm
+
+def zerok_sample(i):
+    observed = _shared_observed["graph"]
+    logging.info(f"Processing sample {i}")
+    R = nx.gnm_random_graph(observed.n_nodes, observed.n_edges)
+    return compute_polarization(R, network_name=network_name)
+
+def onek_sample(i):
+    degree_sequence = _shared_observed["graph"].attributes["degree"].tolist()
+    logging.info(f"Processing sample {i}")
+    R = nx.Graph(nx.configuration_model(degree_sequence))
+    R.remove_edges_from(nx.selfloop_edges(R))
+    return compute_polarization(R, network_name=network_name)
+
+def run_samples_parallel(graph, sample_function, n_samples):
+
+    shared = gs.SharedGraph(graph)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=attach_observed_graph, initargs=(shared.name,)) as executor:
+            buffer = list(executor.map(sample_function, range(n_samples)))
+    finally:
+        shared.close()
+        shared.unlink()
+
+    return buffer
+
+def zerok(graph, n_samples):
     
-    n, m = len(G.nodes), len(G.edges)
+    n, m = graph.n_nodes, graph.n_edges
     
-    buffer = []
-    for i in range(n_samples):
-        logging.info(f"Processing sample {i}")
-        R = nx.gnm_random_graph(n, m)
-        buffer.append(compute_polarization(R, network_name=network_name))
+    if n_workers > 1:
+        buffer = run_samples_parallel(graph, zerok_sample, n_samples)
+    else:
+        buffer = []
+        for i in range(n_samples):
+            logging.info(f"Processing sample {i}")
+            R = nx.gnm_random_graph(n, m)
+            buffer.append(compute_polarization(R, network_name=network_name))
         
     results_averaged = np.mean(buffer, axis=0)
     results_errors = np.std(buffer, axis=0)
     
     return [results_averaged, results_errors]
 
-def onek(G, n_samples):
+def onek(graph, n_samples):
     
-    degree_sequence = [d for v, d in G.degree()]
+    degree_sequence = graph.degree().tolist()
     
-    buffer = []
-    for i in range(n_samples):
-        logging.info(f"Processing sample {i}")
-        R = nx.Graph(nx.configuration_model(degree_sequence))
-        R.remove_edges_from(nx.selfloop_edges(R))
-        buffer.append(compute_polarization(R, network_name=network_name))
+    if n_workers > 1:
+        buffer = run_samples_parallel(graph, onek_sample, n_samples)
+    else:
+        buffer = []
+        for i in range(n_samples):
+            logging.info(f"Processing sample {i}")
+            R = nx.Graph(nx.configuration_model(degree_sequence))
+            R.remove_edges_from(nx.selfloop_edges(R))
+            buffer.append(compute_polarization(R, network_name=network_name))
         
     results_averaged = np.mean(buffer, axis=0)
     results_errors = np.std(buffer, axis=0)
     
     return [results_averaged, results_errors]
 
-def twok(G, n_samples):
+def twok(graph, n_samples):
     
+    G = graph.to_networkx()
     G.remove_edges_from(nx.selfloop_edges(G))
     degree_sequence = [d for v, d in G.degree()]
     deg_dict = dict(zip(G.nodes(), degree_sequence))
@@ -167,20 +204,20 @@ def run_pipeline():
     logging.info(f"Starting randomization pipeline for {network_name}...")
 
     filename = f"./rich-networks/{year}/RICH_{network_name}_{year}_NET.graphml"
-    observed_G = prepare_network(filename=filename)
+    observed_graph = prepare_network(filename=filename)
 
     randomized_pol_dict = dict()
 
     if randomization_strategies["zerok"]:
-        ave, std = zerok(observed_G, n_samples)
+        ave, std = zerok(observed_graph, n_samples)
         randomized_pol_dict["zerok"] = {"ave": list(ave), "std": list(std)}
 
     if randomization_strategies["onek"]:
-        ave, std = onek(observed_G, n_samples)
+        ave, std = onek(observed_graph, n_samples)
         randomized_pol_dict["onek"] = {"ave": list(ave), "std": list(std)}
     
     if randomization_strategies["twok"]:
-        ave, std = twok(observed_G, n_samples)
+        ave, std = twok(observed_graph, n_samples)
         randomized_pol_dict["twok"] = {"ave": list(ave), "std": list(std)}
 
     randomized_pol_dict["mapping"] = "rwc, arwc, ebc, gmck, mblb, mod, ei, extei"
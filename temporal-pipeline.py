@@ -0,0 +1,47 @@
+import logging
+import argparse
+import json
+import os
+
+import temporal as tm
+import edge_store as es
+
+parser = argparse.ArgumentParser()
+parser.add_argument("network_name")
+parser.add_argument("--year", default="2023")
+parser.add_argument("--window", default="7D", help="Length of a time window, e.g. 1D or 7D")
+parser.add_argument("--step", default=None, help="Time between window starts; shorter than the window for sliding windows")
+parser.add_argument("--origin", default=None, help="Start of the first window, e.g. 2023-01-01")
+parser.add_argument("--metrics", nargs="+", default=list(tm.METRICS), choices=tm.METRICS)
+parser.add_argument("--workers", type=int, default=1, help="Number of processes measuring windows in parallel")
+args = parser.parse_args()
+
+network_name = args.network_name
+year = args.year
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def run_pipeline():
+
+    logging.info(f"Starting temporal polarization pipeline for {network_name}...")
+
+    # Edge store written next to the network by the data pipelines
+    path = es.store_path(f"./pure-networks/{year}", f"{network_name}_{year}")
+
+    time_series = tm.polarization_time_series(path, args.window,
+                                              step = args.step,
+                                              origin = args.origin,
+                                              metrics = args.metrics,
+                                              n_workers = args.workers)
+
+    logging.info(f"Temporal polarization pipeline for {network_name} has ended.")
+
+    window_name = args.window if args.step is None else f"{args.window}_{args.step}"
+
+    os.makedirs("temporal_polarization_scores", exist_ok = True)
+    with open(f'./temporal_polarization_scores/{network_name}_{year}_{window_name}_pol.json', 'w') as fp:
+        json.dump(time_series, fp, indent=2)
+
+if __name__ == "__main__":
+    run_pipeline()
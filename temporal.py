@@ -0,0 +1,191 @@
+'''
+    File name: temporal.py
+    Description: Polarization time series of a network, measured on the graphs of
+                 consecutive or sliding time windows of its edge store.
+    Python Version: 3.8
+'''
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import networkx as nx
+import pandas as pd
+import pymetis
+
+import polarization_algorithms as pol
+import graph_store as gs
+import edge_store as es
+
+
+# Polarization measures, named as in the polarization pipeline scores
+METRICS = ("rwc_metis", "arwc_metis", "ei_metis", "extei_metis", "mod_metis", "ebc_metis", "gmck_metis", "mblb_metis")
+
+# Windows whose giant component has fewer nodes are not measured
+MIN_NODES = 20
+
+_MILLISECOND = pd.Timedelta(milliseconds=1)
+
+def to_epoch_ms(timestamp):
+    """Converts a timestamp (string, datetime or pd.Timestamp, UTC when naive) to epoch milliseconds."""
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return (timestamp - pd.Timestamp(0, tz="UTC")) // _MILLISECOND
+
+def time_windows(time_range, size, step=None, origin=None):
+    """
+    Splits a time range into windows.
+
+    Args:
+        time_range (tuple): First and last timestamp to cover, in epoch milliseconds.
+        size (str or pd.Timedelta): Length of a window, e.g. "1D" or "7D".
+        step (str or pd.Timedelta, optional): Time between the starts of two windows.
+            Defaults to size, which gives consecutive windows; a shorter step gives
+            overlapping sliding windows.
+        origin (str or pd.Timestamp, optional): Start of the first window. Defaults
+            to midnight (UTC) of the first timestamp.
+
+    Returns:
+        list: The (start, end) epoch milliseconds of every window, end excluded.
+    """
+    first, last = time_range
+    size_ms = pd.Timedelta(size) // _MILLISECOND
+    step_ms = size_ms if step is None else pd.Timedelta(step) // _MILLISECOND
+
+    if origin is None:
+        origin_ms = to_epoch_ms(pd.Timestamp(first, unit="ms", tz="UTC").floor("D"))
+    else:
+        origin_ms = to_epoch_ms(origin)
+
+    return [(int(start), int(start + size_ms)) for start in range(origin_ms, last + 1, step_ms)]
+
+def partition_metis(graph):
+    """
+    Bisects a graph prepared by graph_store.prepare_graph with METIS.
+
+    The CSR arrays are passed to METIS as they are, with the options of the
+    polarization pipeline.
+
+    Returns:
+        np.ndarray: The cluster (0 or 1) of every node.
+    """
+    _, membership = pymetis.part_graph(nparts = 2, xadj = graph.indptr, adjncy = graph.indices,
+                                       options = pymetis.Options(ufactor=400, niter=100, contig=True))
+    return np.asarray(membership)
+
+def measure_polarization(G, ms, metrics=METRICS, n_sim=10, n_walks=int(1e4)):
+    """
+    Runs the polarization measures of the polarization pipeline on a partitioned graph.
+
+    Args:
+        G (networkx.Graph): Giant component with nodes labelled 0..n-1.
+        ms (dict): Node -> cluster (0 or 1).
+        metrics (iterable, optional): The measures to compute, see METRICS.
+        n_sim (int, optional): Number of RWC simulations.
+        n_walks (int, optional): Number of random walks per RWC simulation.
+
+    Returns:
+        dict: Measure name -> score.
+    """
+    scores = dict()
+
+    if "rwc_metis" in metrics:
+        scores["rwc_metis"] = pol.random_walk_pol(G, ms, 10, n_sim, n_walks)
+    if "arwc_metis" in metrics:
+        scores["arwc_metis"] = pol.random_walk_pol(G, ms, 0.01, n_sim, n_walks)
+    if "ei_metis" in metrics:
+        scores["ei_metis"] = -1*pol.krackhardt_ratio_pol(G, ms)
+    if "extei_metis" in metrics:
+        scores["extei_metis"] = -1*pol.extended_krackhardt_ratio_pol(G, ms)
+    if "mod_metis" in metrics:
+        c1 = [node for node in ms if ms[node] == 0]
+        c2 = [node for node in ms if ms[node] == 1]
+        scores["mod_metis"] = nx.community.modularity(G, [c1, c2])
+    if "ebc_metis" in metrics:
+        scores["ebc_metis"] = pol.betweenness_pol(G, ms)
+    if "gmck_metis" in metrics:
+        scores["gmck_metis"] = pol.gmck_pol(G, ms)
+    if "mblb_metis" in metrics:
+        scores["mblb_metis"] = pol.dipole_pol(G, ms)
+
+    return scores
+
+def measure_window(store, start, end, metrics=METRICS, min_nodes=MIN_NODES):
+    """
+    Builds the graph of the retweets of one time window and measures its polarization.
+
+    The edges of the window are a slice of the time index of the store, so the
+    graph is built from array slices without re-reading any edge list.
+
+    Args:
+        store (edge_store.EdgeStore): The edges of the network.
+        start (int): Start of the window in epoch milliseconds, included.
+        end (int): End of the window in epoch milliseconds, excluded.
+        metrics (iterable, optional): The measures to compute, see METRICS.
+        min_nodes (int, optional): Smallest giant component that is measured.
+
+    Returns:
+        dict: The window, the size of its graph and its scores. Scores are None
+        when the giant component is smaller than min_nodes.
+    """
+    edges = store.between(start, end)
+    result = {"start": str(es.format_timestamps([start])[0]),
+              "end": str(es.format_timestamps([end])[0]),
+              "n_edges": len(edges),
+              "n_nodes": 0}
+    scores = dict.fromkeys(metrics)
+
+    if len(edges) > 0:
+        graph = gs.prepare_graph(store.to_csr(edges))
+        result["n_nodes"] = graph.n_nodes
+
+        if graph.n_nodes >= min_nodes:
+            membership = partition_metis(graph)
+            scores = measure_polarization(graph.to_networkx(), dict(enumerate(membership.tolist())), metrics)
+        else:
+            logging.info(f"Window {result['start']} has {graph.n_nodes} nodes in its giant component, not measured.")
+
+    result.update(scores)
+    return result
+
+# Worker processes
+
+_worker_state = dict()
+
+def _init_worker(path, metrics, min_nodes):
+    # Every worker memory-maps the store once instead of receiving the edges
+    _worker_state.update(store = es.EdgeStore(path), metrics = metrics, min_nodes = min_nodes)
+
+def _measure_window_in_worker(window):
+    start, end = window
+    return measure_window(_worker_state["store"], start, end, _worker_state["metrics"], _worker_state["min_nodes"])
+
+def polarization_time_series(path, size, step=None, origin=None, metrics=METRICS, min_nodes=MIN_NODES, n_workers=1):
+    """
+    Measures the polarization of every time window of a network.
+
+    Args:
+        path (str): Directory of the edge store of the network.
+        size (str or pd.Timedelta): Length of a window, see time_windows.
+        step (str or pd.Timedelta, optional): Time between window starts, see time_windows.
+        origin (str or pd.Timestamp, optional): Start of the first window, see time_windows.
+        metrics (iterable, optional): The measures to compute, see METRICS.
+        min_nodes (int, optional): Smallest giant component that is measured.
+        n_workers (int, optional): Number of processes measuring windows in parallel.
+
+    Returns:
+        list: The result of measure_window for every window, in time order.
+    """
+    store = es.EdgeStore(path)
+    time_range = store.time_range()
+    if time_range is None:
+        return []
+
+    windows = time_windows(time_range, size, step, origin)
+    logging.info(f"Measuring {len(windows)} windows of {size} over {store.n_edges} edges.")
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(path, tuple(metrics), min_nodes)) as executor:
+            return list(executor.map(_measure_window_in_worker, windows))
+
+    return [measure_window(store, start, end, metrics, min_nodes) for start, end in windows]
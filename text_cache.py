@@ -0,0 +1,194 @@
+'''
+    File name: text_cache.py
+    Description: Caches in front of the text preprocessing of the data pipelines.
+    Python Version: 3.8
+'''
+import os
+import json
+import sqlite3
+import logging
+from collections import OrderedDict
+
+
+class LemmaCache():
+    """
+    Token to lemma cache in front of the Voikko analyzer.
+
+    Lemmas are kept in a bounded in-memory LRU cache. With a path, every lemma
+    computed by Voikko is also stored in an SQLite dictionary that later runs
+    (and other corpora or years) consult before calling Voikko.
+
+    Args:
+        voikko (libvoikko.Voikko): The analyzer used on cache misses.
+        maxsize (int, optional): Maximum number of tokens kept in memory.
+        path (str, optional): Location of the persistent lemma dictionary.
+        batch_size (int, optional): Number of new lemmas written to disk at a time.
+    """
+
+    def __init__(self, voikko, maxsize = 2**20, path = None, batch_size = 10000):
+        self.voikko = voikko
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.lemmas = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.connection = None
+        self.pending = []
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+            self.connection = sqlite3.connect(path, timeout = 60)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS lemmas (token TEXT PRIMARY KEY, lemma TEXT) WITHOUT ROWID")
+
+    def _analyze(self, token):
+        lem_analysis = self.voikko.analyze(token)
+        if not lem_analysis:
+            return token
+        return lem_analysis[0].get("BASEFORM")
+
+    def lemmatize(self, token):
+        """
+        Returns the lemma of a token, or the token itself if Voikko cannot analyze it.
+
+        Args:
+            token (str): The token to lemmatize.
+
+        Returns:
+            str: The lemma.
+        """
+        if token in self.lemmas:
+            self.hits += 1
+            self.lemmas.move_to_end(token)
+            return self.lemmas[token]
+
+        lemma = None
+        if self.connection is not None:
+            row = self.connection.execute("SELECT lemma FROM lemmas WHERE token = ?", (token,)).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                lemma = row[0]
+
+        if lemma is None:
+            self.misses += 1
+            lemma = self._analyze(token)
+            if self.connection is not None:
+                self.pending.append((token, lemma))
+                if len(self.pending) >= self.batch_size:
+                    self.flush()
+
+        self.lemmas[token] = lemma
+        if len(self.lemmas) > self.maxsize:
+            self.lemmas.popitem(last = False)
+
+        return lemma
+
+    def known_lemma(self, token):
+        """
+        Returns the lemma of a token found in memory or in the persistent dictionary, without calling Voikko.
+
+        Args:
+            token (str): The token.
+
+        Returns:
+            str: The lemma, or None if the token has not been lemmatized yet.
+        """
+        if token in self.lemmas:
+            return self.lemmas[token]
+        if self.connection is not None:
+            row = self.connection.execute("SELECT lemma FROM lemmas WHERE token = ?", (token,)).fetchone()
+            if row is not None:
+                return row[0]
+        return None
+
+    def flush(self):
+        """Writes the lemmas computed since the last flush to the persistent dictionary."""
+        if self.connection is not None and self.pending:
+            self.connection.executemany("INSERT OR IGNORE INTO lemmas (token, lemma) VALUES (?, ?)", self.pending)
+            self.connection.commit()
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def log_stats(self):
+        logging.info(f"Lemma cache: {self.hits} memory hits, {self.disk_hits} disk hits, "
+                     f"{self.misses} Voikko calls, hit rate {self.hit_rate:.1%}.")
+
+class TokenCache():
+    """
+    Persistent store of the preprocessed token set of every tweet.
+
+    Token sets are keyed by tweet id and appended to an SQLite table in batches,
+    so a run only pays one write per batch. The tokens do not depend on the
+    keyword list, which lets later runs with other keywords skip tokenization
+    and lemmatization for every tweet already processed.
+
+    Args:
+        path (str): Location of the cache file.
+        batch_size (int, optional): Number of token sets written to disk at a time.
+    """
+
+    def __init__(self, path, batch_size = 10000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+        self.connection = sqlite3.connect(path, timeout = 60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tokens (tweet_id TEXT PRIMARY KEY, tokens TEXT) WITHOUT ROWID")
+        self.batch_size = batch_size
+        self.pending = dict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tweet_id):
+        """
+        Returns the cached token set of a tweet.
+
+        Args:
+            tweet_id (str): Id of the tweet whose text was preprocessed.
+
+        Returns:
+            set: The token set, or None if the tweet has not been processed yet.
+        """
+        tweet_id = str(tweet_id)
+
+        if tweet_id in self.pending:
+            self.hits += 1
+            return self.pending[tweet_id]
+
+        row = self.connection.execute("SELECT tokens FROM tokens WHERE tweet_id = ?", (tweet_id,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return set(json.loads(row[0]))
+
+    def put(self, tweet_id, tokens):
+        """Stores the token set of a tweet."""
+        self.pending[str(tweet_id)] = set(tokens)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Appends the token sets stored since the last flush to the cache file."""
+        if self.pending:
+            rows = [(tweet_id, json.dumps(sorted(tokens), ensure_ascii = False)) for tweet_id, tokens in self.pending.items()]
+            self.connection.executemany("INSERT OR IGNORE INTO tokens (tweet_id, tokens) VALUES (?, ?)", rows)
+            self.connection.commit()
+            self.pending = dict()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def log_stats(self):
+        logging.info(f"Token cache: {self.hits} tweets reused, {self.misses} tweets preprocessed.")
@@ -0,0 +1,120 @@
+'''
+    File name: text_processing.py
+    Description: Tokenization, lemmatization and keyword matching shared by the
+                 data pipelines.
+    Python Version: 3.8
+'''
+import re
+
+
+def extract_tokens(text):
+    """
+    Extracts all words from a text string.
+
+    Args:
+        text (str): The text string to extract words from.
+
+    Returns:
+        list: A list of all words in the text string, in the order they appear.
+    """
+    return re.findall(r"\b[A-Za-z-äö]+\b", text)
+
+def remove_short_tokens(text, minimum_length = 2):
+    """
+    Removes all words from a list that are shorter than a given minimum length.
+
+    Args:
+        text (list): The list of words to remove short words from.
+        minimum_length (int, optional): The minimum length of words to keep. Defaults to 2.
+
+    Returns:
+        list: A list of all words in the input list that have a length greater than or equal to minimum_length.
+    """
+    return [w for w in text if len(w) >= minimum_length]
+
+def lowercase_tokens(tokens):
+    """
+    Converts all strings in the given list to lowercase.
+
+    Parameters:
+    strings (list): A list of strings.
+
+    Returns:
+    list: A new list with all the strings converted to lowercase.
+    """
+    return [s.lower() for s in tokens]
+
+def check_relevancy(tokens, selected_keywords):
+    """
+    Determines whether a set of tokens contains any of the selected keywords.
+
+    Args:
+        tokens (set): A set of string tokens to check for relevancy.
+        selected_keywords (set): A set of string keywords to match against the tokens.
+
+    Returns:
+        bool: True if the intersection of the token set and the selected keyword set is non-empty,
+        indicating that at least one keyword was found in the token set. False otherwise.
+    """
+    return bool(tokens & selected_keywords)
+
+class TextPreprocessor():
+    """
+    Turns tweet texts and keyword lists into comparable sets of lemmas.
+
+    Args:
+        lemmatizer (text_cache.LemmaCache): Lemmatizer in front of a Voikko instance.
+    """
+
+    def __init__(self, lemmatizer):
+        self.lemmatizer = lemmatizer
+
+    def lemmatize_tokens(self, tokens):
+        """
+        Lemmatizes a list of tokens using the Voikko lemmatizer.
+
+        Args:
+            tokens (list): A list of tokenized words to be lemmatized.
+
+        Returns:
+            list: A list of the lemmatized tokens.
+
+        Note:
+            If a token cannot be analyzed, the original token is added to the output list.
+            Lemmas are looked up in the lemma cache first, so Voikko only sees each token once.
+        """
+        return [self.lemmatizer.lemmatize(token) for token in tokens]
+
+    def preprocess_text(self, text):
+        """
+        Preprocesses the input text by applying a series of text cleaning and normalization techniques,
+        including tokenization, lowercasing, lemmatization, and removal of short tokens.
+
+        Args:
+        - text (str): The input text to preprocess.
+
+        Returns:
+        - processed_text (set of str): The preprocessed tokens, in lowercase and lemmatized form,
+          with short tokens (i.e., tokens with length < 2) removed.
+        """
+        processed_text = lowercase_tokens(
+                            self.lemmatize_tokens(
+                                remove_short_tokens(
+                                    extract_tokens(text)
+                                )
+                            )
+                        )
+
+        return set(processed_text)
+
+    def preprocess_keywords(self, keywords):
+        """Lemmatizes and lowercases a keyword list into the set matched by check_relevancy."""
+        lemmatized_keywords = lowercase_tokens(
+                                self.lemmatize_tokens(keywords)
+                            )
+
+        return set(lemmatized_keywords)
+
+    def close(self):
+        self.lemmatizer.log_stats()
+        self.lemmatizer.close()
@@ -0,0 +1,165 @@
+'''
+    File name: token_index.py
+    Description: Inverted index from lemmas to the retweets containing them.
+                 Building a topic network from the index is a query over the
+                 posting lists instead of a new pass over the raw corpus.
+    Python Version: 3.8
+'''
+import os
+import json
+import logging
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class TokenIndexBuilder():
+    """
+    Collects retweets and their lemmatized tokens and writes them as a token index.
+
+    Every retweet becomes a row. The edge endpoints are interned into integer
+    user codes and, together with the timestamps (epoch milliseconds), stored as
+    columns. Each lemma gets a posting list of the rows it occurs in.
+
+    Args:
+        path (str): Directory the index is written to.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.user_codes = dict()
+        self.sources = array("i")
+        self.targets = array("i")
+        self.timestamps = array("q")
+        self.postings = dict()
+
+    @property
+    def n_rows(self):
+        return len(self.sources)
+
+    def _user_code(self, user_id):
+        user_id = str(user_id)
+        if user_id not in self.user_codes:
+            self.user_codes[user_id] = len(self.user_codes)
+        return self.user_codes[user_id]
+
+    def add(self, source, target, timestamp, tokens):
+        """
+        Adds one retweet to the index.
+
+        Args:
+            source (str): Id of the retweeting user.
+            target (str): Id of the retweeted user.
+            timestamp (str): ISO 8601 creation time of the retweet.
+            tokens (set): The preprocessed tokens of the retweeted text.
+        """
+        row = self.n_rows
+        self.sources.append(self._user_code(source))
+        self.targets.append(self._user_code(target))
+        self.timestamps.append(int(np.datetime64(timestamp.rstrip("Z"), "ms").astype(np.int64)))
+
+        for token in tokens:
+            if token not in self.postings:
+                self.postings[token] = array("q")
+            self.postings[token].append(row)
+
+    def write(self):
+        """Writes the index to its directory."""
+        os.makedirs(self.path, exist_ok = True)
+
+        users = np.empty(len(self.user_codes), dtype = object)
+        for user_id, code in self.user_codes.items():
+            users[code] = user_id
+
+        lemmas = sorted(self.postings)
+        lengths = np.asarray([len(self.postings[lemma]) for lemma in lemmas], dtype = np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        postings = np.empty(offsets[-1], dtype = np.int64)
+        for lemma, start in zip(lemmas, offsets[:-1]):
+            posting = np.frombuffer(self.postings[lemma], dtype = np.int64)
+            postings[start:start + len(posting)] = posting
+
+        np.save(os.path.join(self.path, "users.npy"), users.astype(str))
+        np.save(os.path.join(self.path, "sources.npy"), np.frombuffer(self.sources, dtype = np.int32))
+        np.save(os.path.join(self.path, "targets.npy"), np.frombuffer(self.targets, dtype = np.int32))
+        np.save(os.path.join(self.path, "timestamps.npy"), np.frombuffer(self.timestamps, dtype = np.int64))
+        np.save(os.path.join(self.path, "lemmas.npy"), np.asarray(lemmas, dtype = str))
+        np.save(os.path.join(self.path, "offsets.npy"), offsets)
+        np.save(os.path.join(self.path, "postings.npy"), postings)
+
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"n_rows": self.n_rows, "n_users": len(users), "n_lemmas": len(lemmas)}, f, indent = 2)
+
+        logging.info(f"Token index with {self.n_rows} retweets and {len(lemmas)} lemmas written to {self.path}.")
+
+
+class TokenIndex():
+    """
+    Read-only view of a token index written by TokenIndexBuilder.
+
+    Args:
+        path (str): Directory of the index.
+    """
+
+    def __init__(self, path):
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode = "r")
+
+        self.path = path
+        self.users = load("users.npy")
+        self.sources = load("sources.npy")
+        self.targets = load("targets.npy")
+        self.timestamps = load("timestamps.npy")
+        self.lemmas = load("lemmas.npy")
+        self.offsets = load("offsets.npy")
+        self.postings = load("postings.npy")
+
+    def rows(self, keywords):
+        """
+        Returns the rows of the retweets containing any of the keywords.
+
+        Args:
+            keywords (set): Preprocessed (lemmatized, lowercase) keywords.
+
+        Returns:
+            numpy.ndarray: Sorted row numbers, i.e. the retweets in ingestion order.
+        """
+        keywords = np.asarray(sorted(keywords), dtype = str)
+        if len(keywords) == 0 or len(self.lemmas) == 0:
+            return np.empty(0, dtype = np.int64)
+
+        positions = np.searchsorted(self.lemmas, keywords)
+        found = positions < len(self.lemmas)
+        positions, keywords = positions[found], keywords[found]
+        positions = positions[self.lemmas[positions] == keywords]
+
+        postings = [self.postings[self.offsets[p]:self.offsets[p + 1]] for p in positions]
+        if not postings:
+            return np.empty(0, dtype = np.int64)
+
+        return np.unique(np.concatenate(postings))
+
+    def edges(self, keywords):
+        """
+        Materializes the edge list of the retweets containing any of the keywords.
+
+        Args:
+            keywords (set): Preprocessed (lemmatized, lowercase) keywords.
+
+        Returns:
+            pandas.DataFrame: Columns source, target and timestamp, in ingestion order.
+            Timestamps are ISO 8601 strings with millisecond precision.
+        """
+        rows = self.rows(keywords)
+        timestamps = np.asarray(self.timestamps[rows]).astype("datetime64[ms]")
+
+        return pd.DataFrame({"source": self.users[self.sources[rows]],
+                             "target": self.users[self.targets[rows]],
+                             "timestamp": np.char.add(np.datetime_as_string(timestamps, unit = "ms"), "Z")})
+
+    def write_edgelist(self, keywords, filename):
+        """Writes the edge list of a keyword set in the layout of the data pipelines and returns its length."""
+        df = self.edges(keywords)
+        df.to_csv(filename, index = False, header = False)
+        return len(df)